@@ -0,0 +1,160 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BACKENDS = ("sqlite", "bitcask")
+
+
+class EventStore(ABC):
+    """Storage backend for one shard: dedup on ``(topic, event_id)`` plus reads.
+
+    Backends implement the abstract methods; the rest are derived from them
+    or are no-ops for features a backend does not have (pre-filter,
+    retention partitions, payload migration, background merge).
+    """
+
+    @abstractmethod
+    def init_db(self):
+        """Open or create the store; called once before any other method."""
+
+    @abstractmethod
+    def record_events_rowids(self, events: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """Record a batch atomically; the rowid of each new event, None for duplicates.
+
+        Rowids increase with every new event, so they double as a cursor.
+        """
+
+    @abstractmethod
+    def list_events_page(
+        self,
+        topic: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: int = 0,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """Keyset page of ``(rowid, event)`` pairs with rowid > ``after``, in rowid order.
+
+        ``since``/``until`` bound the event ``timestamp`` (inclusive, compared
+        as strings); ``payload_filters`` maps dotted payload fields to
+        required values. A page shorter than ``limit`` means no more rows.
+        """
+
+    @abstractmethod
+    def topic_stats(self) -> List[Dict[str, Any]]:
+        """Per-topic ``unique_count``, ``duplicate_count``, ``first_seen``, ``last_seen``, ``last_event_id``."""
+
+    @abstractmethod
+    def last_rowid(self) -> int:
+        """Newest rowid in the store (0 when empty)."""
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def record_event(self, topic: str, event_id: str, timestamp: str, source: str, payload: Dict[str, Any]) -> bool:
+        """Try to record. Return True if new, False if duplicate."""
+        event = {"topic": topic, "event_id": event_id, "timestamp": timestamp, "source": source, "payload": payload}
+        return self.record_events([event])[0]
+
+    def record_events(self, events: List[Dict[str, Any]]) -> List[bool]:
+        """Record a batch in a single transaction.
+
+        Returns one flag per input event, in order: True if it was new, False if
+        it was a duplicate (of a stored event or of an earlier one in the batch).
+        """
+        return [rowid is not None for rowid in self.record_events_rowids(events)]
+
+    def list_events(
+        self,
+        topic: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: int = 0,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        return [row for _, row in self.list_events_page(topic, limit, after, since, until, payload_filters)]
+
+    def iter_events(
+        self,
+        topic: Optional[str] = None,
+        after: int = 0,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        chunk_size: int = 1000,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Stream ``(rowid, event)`` pairs in keyset chunks.
+
+        A connection (or lock) is only held while one chunk is fetched, so a
+        long export never stalls the writer.
+        """
+        while True:
+            page = self.list_events_page(topic, chunk_size, after, since, until, payload_filters)
+            yield from page
+            if len(page) < chunk_size:
+                return
+            after = page[-1][0]
+
+    def list_topics(self) -> List[str]:
+        return [row["topic"] for row in self.topic_stats()]
+
+    def prefilter_stats(self) -> Optional[Dict[str, int]]:
+        return None
+
+    def partition_stats(self) -> List[Dict[str, Any]]:
+        return []
+
+    def drop_expired_partitions(self) -> List[str]:
+        return []
+
+    def rebuild_prefilter(self, chunk_size: int = 10000) -> Iterator[int]:
+        return iter(())
+
+    def incremental_vacuum(self, pages: int = 256) -> int:
+        return 0
+
+    def migrate_payloads(self, batch_size: int = 1000) -> int:
+        return 0
+
+    def merge(self) -> int:
+        """One background compaction pass; returns the number of files merged."""
+        return 0
+
+
+def create_store(db_path: str, settings) -> EventStore:
+    """Build the backend selected by ``settings.backend`` for one shard path."""
+    if settings.backend == "sqlite":
+        from .dedup import DedupStore
+
+        return DedupStore(
+            db_path,
+            journal_mode=settings.journal_mode,
+            synchronous=settings.synchronous,
+            lru_size=settings.lru_size,
+            bloom_capacity=settings.bloom_capacity,
+            bloom_error_rate=settings.bloom_error_rate,
+            payload_compress_threshold=settings.payload_compress_threshold,
+            retention_seconds=settings.retention_days * 86400,
+            partition_seconds=settings.partition_hours * 3600,
+            read_connections=settings.read_pool_size,
+        )
+    if settings.backend == "bitcask":
+        from .bitcask import BitcaskStore
+
+        if settings.retention_days:
+            raise ValueError("retention_days is only supported by the sqlite backend")
+        return BitcaskStore(
+            bitcask_dir(db_path),
+            synchronous=settings.synchronous,
+            max_file_bytes=settings.bitcask_max_file_bytes,
+            merge_min_files=settings.bitcask_merge_min_files,
+        )
+    raise ValueError(f"Unsupported backend: {settings.backend!r} (expected one of {', '.join(BACKENDS)})")
+
+
+def bitcask_dir(db_path: str) -> str:
+    """``dedup.db`` -> ``dedup.bitcask`` (a directory of data and hint files)."""
+    return os.path.splitext(db_path)[0] + ".bitcask"
@@ -0,0 +1,499 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .backend import EventStore
+from .codec import extract
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+# Data record: crc32 | seq | flags | topic_len | id_len | value_len, then the
+# topic, the event_id and the JSON value. The crc covers everything after it.
+_HEADER = struct.Struct(">IQBHHI")
+# Hint record: seq | offset | size | topic_len | id_len, then topic and event_id.
+_HINT = struct.Struct(">QQIHH")
+# topic_len and id_len are 16-bit, so neither key part may exceed this many UTF-8 bytes.
+MAX_KEY_BYTES = 0xFFFF
+# Set on the last record of each batch; records after the last one are a torn batch.
+FLAG_COMMIT = 1
+
+SYNC_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# Records located per lock acquisition by list_events_page; the reads happen outside the lock.
+READ_CHUNK = 256
+
+Entry = Tuple[int, int, int, str, str]  # (seq, offset, size, topic, event_id)
+
+
+class BitcaskError(RuntimeError):
+    pass
+
+
+class BitcaskStore(EventStore):
+    """Append-only log backend in the style of Bitcask.
+
+    New events are appended to the active data file; an in-memory keydir maps
+    ``(topic, event_id)`` to the event's sequence number (its rowid), and a
+    location table maps each sequence number to ``(file, offset, size)``.
+    Duplicate checks never touch the disk.
+
+    Data files are never modified once rotated. On rotation (and on close)
+    a hint file listing the keys and locations of a data file is written, so
+    startup rebuilds the keydir from hints instead of reading every value;
+    files without a hint (the active file after a crash) are scanned and a
+    torn final batch is truncated. Startup always opens a fresh active file.
+
+    ``merge`` rewrites the immutable files into one, so the number of files
+    (and of hints to read at startup) stays bounded.
+
+    Only records are durable: duplicate counts and first/last seen times are
+    saved to ``topic_stats.json`` on close and merge, so after a crash they
+    are as of the last clean save. Unique counts come from the records.
+
+    The keydir lives in one process, so a directory can only be opened by
+    one process at a time (``init_db`` takes an exclusive ``flock``); run a
+    single uvicorn worker per data directory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        synchronous: Optional[str] = None,
+        max_file_bytes: int = 64 * 1024 * 1024,
+        merge_min_files: int = 4,
+    ):
+        if synchronous is not None and synchronous.upper() not in SYNC_LEVELS:
+            raise ValueError(f"Unsupported synchronous level: {synchronous}")
+        self.directory = directory
+        # OFF: never fsync. NORMAL: fsync data files when they are rotated or
+        # closed. FULL/EXTRA: fsync after every batch.
+        self.synchronous = synchronous.upper() if synchronous else "NORMAL"
+        self.max_file_bytes = max_file_bytes
+        self.merge_min_files = max(2, merge_min_files)
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._keydir: Dict[Tuple[str, str], int] = {}
+        # Indexed by seq - 1.
+        self._file_ids = array("I")
+        self._offsets = array("Q")
+        self._sizes = array("I")
+        self._topic_seqs: Dict[str, array] = {}
+        # topic -> [unique_count, duplicate_count, first_seen, last_seen, last_event_id]
+        self._topic_stats: Dict[str, List[Any]] = {}
+        self._readers: Dict[int, int] = {}
+        self._lock_file = None
+        self._active_id = 0
+        self._active_fd: Optional[int] = None
+        self._active_size = 0
+        # Hint entries of the active file, written out when it is sealed.
+        self._active_entries: List[Entry] = []
+        self._seq = 0
+        self.stats = {"merges": 0, "files_merged": 0, "truncated_bytes": 0}
+
+    # --- Files ---
+
+    def _path(self, file_id: int, ext: str) -> str:
+        return os.path.join(self.directory, f"{file_id:09d}.{ext}")
+
+    def _file_ids_on_disk(self) -> List[int]:
+        return sorted(int(name[:-5]) for name in os.listdir(self.directory) if name.endswith(".data"))
+
+    def _open_active(self):
+        self._active_id += 1
+        path = self._path(self._active_id, "data")
+        self._active_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._readers[self._active_id] = os.open(path, os.O_RDONLY)
+        self._active_size = 0
+        self._active_entries = []
+
+    def _close_active(self):
+        """Seal the active file: fsync (unless OFF) and write its hint."""
+        if self._active_fd is None:
+            return
+        if self._active_size == 0:
+            # Nothing was written: drop the file instead of keeping an empty one per restart.
+            os.close(self._active_fd)
+            os.close(self._readers.pop(self._active_id))
+            os.remove(self._path(self._active_id, "data"))
+            self._active_fd = None
+            return
+        if self.synchronous != "OFF":
+            os.fsync(self._active_fd)
+        os.close(self._active_fd)
+        self._active_fd = None
+        self._write_hint(self._active_id, self._active_entries)
+
+    def _write_hint(self, file_id: int, entries: List[Entry]):
+        parts = []
+        for seq, offset, size, topic, event_id in entries:
+            t, e = topic.encode("utf-8"), event_id.encode("utf-8")
+            parts.append(_HINT.pack(seq, offset, size, len(t), len(e)) + t + e)
+        self._write_atomic(self._path(file_id, "hint"), b"".join(parts))
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            if self.synchronous != "OFF":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read_hint(path: str) -> Iterator[Entry]:
+        with open(path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos < len(data):
+            seq, offset, size, tlen, elen = _HINT.unpack_from(data, pos)
+            pos += _HINT.size
+            topic = data[pos:pos + tlen].decode("utf-8")
+            event_id = data[pos + tlen:pos + tlen + elen].decode("utf-8")
+            pos += tlen + elen
+            yield seq, offset, size, topic, event_id
+
+    def _scan_data(self, file_id: int) -> List[Entry]:
+        """Entries of a data file without a hint, truncating anything after the last committed batch."""
+        path = self._path(file_id, "data")
+        with open(path, "rb") as f:
+            data = f.read()
+        entries: List[Entry] = []
+        committed, end = 0, 0
+        pos = 0
+        while pos + _HEADER.size <= len(data):
+            crc, seq, flags, tlen, elen, vlen = _HEADER.unpack_from(data, pos)
+            size = _HEADER.size + tlen + elen + vlen
+            if pos + size > len(data) or zlib.crc32(data[pos + 4:pos + size]) != crc:
+                break
+            body = pos + _HEADER.size
+            topic = data[body:body + tlen].decode("utf-8")
+            event_id = data[body + tlen:body + tlen + elen].decode("utf-8")
+            entries.append((seq, pos, size, topic, event_id))
+            pos += size
+            if flags & FLAG_COMMIT:
+                committed, end = len(entries), pos
+        if end < len(data):
+            self.stats["truncated_bytes"] += len(data) - end
+            with open(path, "r+b") as f:
+                f.truncate(end)
+        return entries[:committed]
+
+    # --- Lifecycle ---
+
+    def init_db(self):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock_file = open(os.path.join(self.directory, "LOCK"), "w")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    self._lock_file.close()
+                    self._lock_file = None
+                    raise BitcaskError(
+                        f"Bitcask directory is used by another process: {self.directory} "
+                        "(the bitcask backend supports a single process)"
+                    )
+            for name in os.listdir(self.directory):
+                if name.endswith(".tmp"):
+                    os.remove(os.path.join(self.directory, name))
+            located: Dict[int, Tuple[int, int, int, str, str]] = {}
+            file_ids = self._file_ids_on_disk()
+            for file_id in file_ids:
+                hint = self._path(file_id, "hint")
+                if os.path.exists(hint):
+                    entries = list(self._read_hint(hint))
+                else:
+                    entries = self._scan_data(file_id)
+                    self._write_hint(file_id, entries)
+                for seq, offset, size, topic, event_id in entries:
+                    # A merge interrupted before deleting its inputs leaves two
+                    # copies of the same records; either location is valid.
+                    located.setdefault(seq, (file_id, offset, size, topic, event_id))
+                self._readers[file_id] = os.open(self._path(file_id, "data"), os.O_RDONLY)
+            self._seq = max(located, default=0)
+            self._file_ids = array("I", [0] * self._seq)
+            self._offsets = array("Q", [0] * self._seq)
+            self._sizes = array("I", [0] * self._seq)
+            last_ids: Dict[str, str] = {}
+            for seq in sorted(located):
+                file_id, offset, size, topic, event_id = located[seq]
+                self._file_ids[seq - 1] = file_id
+                self._offsets[seq - 1] = offset
+                self._sizes[seq - 1] = size
+                self._keydir[(topic, event_id)] = seq
+                self._topic_seqs.setdefault(topic, array("Q")).append(seq)
+                last_ids[topic] = event_id
+            self._load_topic_stats(last_ids)
+            self._active_id = max(file_ids, default=0)
+            self._open_active()
+
+    def _load_topic_stats(self, last_ids: Dict[str, str]):
+        saved: Dict[str, List[Any]] = {}
+        path = os.path.join(self.directory, "topic_stats.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+        for topic in set(saved) | set(self._topic_seqs):
+            _, duplicates, first_seen, last_seen, _ = saved.get(topic, [0, 0, None, None, None])
+            seqs = self._topic_seqs.get(topic, ())
+            self._topic_stats[topic] = [len(seqs), duplicates, first_seen, last_seen, last_ids.get(topic)]
+
+    def _save_topic_stats(self):
+        with self._lock:
+            data = json.dumps(self._topic_stats).encode("utf-8")
+        self._write_atomic(os.path.join(self.directory, "topic_stats.json"), data)
+
+    def close(self):
+        if self._active_fd is None and not self._readers and self._lock_file is None:
+            return
+        if self._active_fd is not None or self._readers:
+            with self._lock:
+                self._close_active()
+            self._save_topic_stats()
+        with self._lock:
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers = {}
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    # --- Writes ---
+
+    def record_events_rowids(self, events: List[Dict[str, Any]]) -> List[Optional[int]]:
+        rowids: List[Optional[int]] = []
+        records: List[Tuple[int, str, str, bytes]] = []
+        with self._lock:
+            if self._active_size >= self.max_file_bytes:
+                self._close_active()
+                self._open_active()
+            batch_keys = {}
+            seq = self._seq
+            for ev in events:
+                key = (ev["topic"], ev["event_id"])
+                if key in self._keydir or key in batch_keys:
+                    rowids.append(None)
+                    continue
+                seq += 1
+                batch_keys[key] = seq
+                rowids.append(seq)
+                value = json.dumps(
+                    [ev["timestamp"], ev.get("source", ""), ev.get("payload", {})],
+                    separators=(",", ":"),
+                    ensure_ascii=False,
+                    default=str,
+                ).encode("utf-8")
+                records.append((seq, ev["topic"], ev["event_id"], value))
+
+            offset = self._active_size
+            chunks: List[bytes] = []
+            locations: List[Tuple[int, int]] = []
+            for i, (rec_seq, topic, event_id, value) in enumerate(records):
+                t, e = topic.encode("utf-8"), event_id.encode("utf-8")
+                if len(t) > MAX_KEY_BYTES or len(e) > MAX_KEY_BYTES:
+                    raise ValueError(f"topic and event_id must be at most {MAX_KEY_BYTES} bytes")
+                flags = FLAG_COMMIT if i == len(records) - 1 else 0
+                body = _HEADER.pack(0, rec_seq, flags, len(t), len(e), len(value))[4:] + t + e + value
+                record = struct.pack(">I", zlib.crc32(body)) + body
+                chunks.append(record)
+                locations.append((offset, len(record)))
+                offset += len(record)
+            if chunks:
+                data = b"".join(chunks)
+                try:
+                    written = os.write(self._active_fd, data)
+                    if written != len(data):
+                        raise OSError(f"Short write to {self._path(self._active_id, 'data')}")
+                    if self.synchronous in ("FULL", "EXTRA"):
+                        os.fsync(self._active_fd)
+                except OSError:
+                    # Keep the batch atomic: cut the file back to where it started.
+                    os.ftruncate(self._active_fd, self._active_size)
+                    raise
+                self._active_size = offset
+
+            for (rec_seq, topic, event_id, _), (rec_offset, size) in zip(records, locations):
+                self._file_ids.append(self._active_id)
+                self._offsets.append(rec_offset)
+                self._sizes.append(size)
+                self._keydir[(topic, event_id)] = rec_seq
+                self._topic_seqs.setdefault(topic, array("Q")).append(rec_seq)
+                self._active_entries.append((rec_seq, rec_offset, size, topic, event_id))
+            self._seq = seq
+            self._update_topic_stats(events, rowids)
+        return rowids
+
+    def _update_topic_stats(self, events: List[Dict[str, Any]], rowids: List[Optional[int]]):
+        now = datetime.now(timezone.utc).isoformat()
+        for ev, rowid in zip(events, rowids):
+            stats = self._topic_stats.setdefault(ev["topic"], [0, 0, now, now, None])
+            if rowid is not None:
+                stats[0] += 1
+                stats[4] = ev["event_id"]
+            else:
+                stats[1] += 1
+            stats[2] = stats[2] or now
+            stats[3] = now
+
+    # --- Reads ---
+
+    def _locate(self, topic: Optional[str], after: int, count: int) -> Tuple[List[Tuple[int, int, int, int]], Dict[int, int]]:
+        """Locations ``(seq, file_id, offset, size)`` of the next ``count`` records after ``after``.
+
+        Also returns duplicated read fds for their files, so the records can be
+        read after the lock is released even if a merge closes and deletes the files.
+        """
+        with self._lock:
+            if topic:
+                seqs = self._topic_seqs.get(topic, array("Q"))
+                start = bisect_right(seqs, after)
+                chosen = seqs[start:start + count]
+            else:
+                chosen = range(after + 1, min(self._seq, after + count) + 1)
+            locations = [(seq, self._file_ids[seq - 1], self._offsets[seq - 1], self._sizes[seq - 1]) for seq in chosen]
+            fds = {file_id: os.dup(self._readers[file_id]) for file_id in {loc[1] for loc in locations}}
+        return locations, fds
+
+    @staticmethod
+    def _decode(data: bytes) -> Dict[str, Any]:
+        _, _, _, tlen, elen, _ = _HEADER.unpack_from(data)
+        body = _HEADER.size
+        timestamp, source, payload = json.loads(data[body + tlen + elen:])
+        return {
+            "topic": data[body:body + tlen].decode("utf-8"),
+            "event_id": data[body + tlen:body + tlen + elen].decode("utf-8"),
+            "timestamp": timestamp,
+            "source": source,
+            "payload": payload,
+        }
+
+    def list_events_page(
+        self,
+        topic: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: int = 0,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """Keyset page of ``(rowid, event)`` pairs; all filters are applied after reading the value.
+
+        Only locating the records takes the writer lock, in chunks of
+        ``READ_CHUNK``; reading and decoding them does not block writes.
+        """
+        filters = list((payload_filters or {}).items())
+        page: List[Tuple[int, Dict[str, Any]]] = []
+        while True:
+            locations, fds = self._locate(topic, after, READ_CHUNK)
+            if not locations:
+                return page
+            try:
+                for seq, file_id, offset, size in locations:
+                    event = self._decode(os.pread(fds[file_id], size, offset))
+                    if since and (event["timestamp"] is None or event["timestamp"] < since):
+                        continue
+                    if until and (event["timestamp"] is None or event["timestamp"] > until):
+                        continue
+                    if any(extract(event["payload"], f) != v for f, v in filters):
+                        continue
+                    page.append((seq, event))
+                    if limit is not None and len(page) >= limit:
+                        return page
+            finally:
+                for fd in fds.values():
+                    os.close(fd)
+            after = locations[-1][0]
+
+    def topic_stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [(topic, *stats) for topic, stats in self._topic_stats.items()]
+        return [
+            {
+                "topic": r[0],
+                "unique_count": r[1],
+                "duplicate_count": r[2],
+                "first_seen": r[3],
+                "last_seen": r[4],
+                "last_event_id": r[5],
+            }
+            for r in sorted(rows)
+        ]
+
+    def last_rowid(self) -> int:
+        return self._seq
+
+    def file_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"files": len(self._readers), "keys": len(self._keydir), "active_bytes": self._active_size}
+
+    # --- Merge ---
+
+    def merge(self) -> int:
+        """Rewrite all immutable data files into one new file; returns how many were merged.
+
+        Records are copied outside the lock (immutable files never change),
+        then the locations are switched over and the old files deleted under
+        the lock. Does nothing with fewer than ``merge_min_files`` immutable files.
+        """
+        with self._merge_lock:
+            with self._lock:
+                sources = sorted(fid for fid in self._readers if fid != self._active_id)
+                if len(sources) < self.merge_min_files:
+                    return 0
+                fds = {fid: self._readers[fid] for fid in sources}
+                # Rotate so the merged file gets an id no writer will reuse.
+                self._close_active()
+                merged_id = self._active_id + 1
+                self._active_id = merged_id
+                self._open_active()
+
+            # Keys are never overwritten, so every record is live; the hints list them.
+            # Only a copy left by an interrupted merge is skipped: its seq points elsewhere.
+            # Records only move in merge, which holds _merge_lock, so no lock is needed here.
+            live = [
+                (seq, fid, rec_offset, size, topic, event_id)
+                for fid in sources
+                for seq, rec_offset, size, topic, event_id in self._read_hint(self._path(fid, "hint"))
+                if self._file_ids[seq - 1] == fid
+            ]
+            live.sort()
+            path = self._path(merged_id, "data")
+            entries: List[Entry] = []
+            offset = 0
+            with open(path, "wb") as out:
+                for seq, fid, rec_offset, size, topic, event_id in live:
+                    out.write(os.pread(fds[fid], size, rec_offset))
+                    entries.append((seq, offset, size, topic, event_id))
+                    offset += size
+                out.flush()
+                if self.synchronous != "OFF":
+                    os.fsync(out.fileno())
+            self._write_hint(merged_id, entries)
+
+            with self._lock:
+                self._readers[merged_id] = os.open(path, os.O_RDONLY)
+                for seq, new_offset, _, _, _ in entries:
+                    self._file_ids[seq - 1] = merged_id
+                    self._offsets[seq - 1] = new_offset
+                for fid in sources:
+                    os.close(self._readers.pop(fid))
+            for fid in sources:
+                for ext in ("hint", "data"):
+                    try:
+                        os.remove(self._path(fid, ext))
+                    except FileNotFoundError:
+                        pass
+            self._save_topic_stats()
+            self.stats["merges"] += 1
+            self.stats["files_merged"] += len(sources)
+            return len(sources)
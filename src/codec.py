@@ -0,0 +1,83 @@
+import ast
+import json
+import re
+import zlib
+from typing import Any, Optional, Tuple, Union
+
+# Values of the per-row ``payload_format`` column. Rows written before the
+# column existed have NULL, which means the legacy ``str(dict)`` repr.
+FORMAT_REPR = "repr"
+FORMAT_JSON = "json"
+FORMAT_ZJSON = "zjson"
+
+_PATH_SEGMENT = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+class PayloadCodec:
+    """Encode payloads as canonical compact JSON, zlib-compressing large ones.
+
+    Compression only kicks in for payloads of at least ``compress_threshold``
+    bytes (0 disables it) and only when it actually saves space. JSON rows
+    stay queryable with SQLite's ``json_extract``; compressed rows are
+    filtered in Python after decoding.
+    """
+
+    def __init__(self, compress_threshold: int = 0, level: int = 6):
+        self.compress_threshold = compress_threshold
+        self.level = level
+
+    def encode(self, payload: Any) -> Tuple[Union[str, bytes], str]:
+        text = json.dumps(payload, separators=(",", ":"), sort_keys=True, ensure_ascii=False, default=str)
+        if self.compress_threshold:
+            raw = text.encode("utf-8")
+            if len(raw) >= self.compress_threshold:
+                packed = zlib.compress(raw, self.level)
+                if len(packed) < len(raw):
+                    return packed, FORMAT_ZJSON
+        return text, FORMAT_JSON
+
+    @staticmethod
+    def decode(value: Union[str, bytes, None], fmt: Optional[str]) -> Any:
+        if value is None:
+            return None
+        if fmt == FORMAT_JSON:
+            return json.loads(value)
+        if fmt == FORMAT_ZJSON:
+            return json.loads(zlib.decompress(value).decode("utf-8"))
+        # Legacy repr rows: literal_eval only evaluates literals, never code.
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+
+
+def payload_path(field: str) -> str:
+    """Turn ``user.id`` into the JSON path ``$.user.id``; raises ValueError."""
+    segments = field.split(".")
+    if not all(_PATH_SEGMENT.match(seg) for seg in segments):
+        raise ValueError(f"Invalid payload field: {field!r}")
+    return "$." + ".".join(f'"{seg}"' for seg in segments)
+
+
+def filter_value(raw: str) -> Any:
+    """Query-string value as JSON when possible (numbers, booleans), else the string."""
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return raw
+    return value if isinstance(value, (str, int, float, bool)) or value is None else raw
+
+
+def extract(payload: Any, field: str) -> Any:
+    for seg in field.split("."):
+        if not isinstance(payload, dict) or seg not in payload:
+            return None
+        payload = payload[seg]
+    return payload
+
+
+def sql_value(value: Any) -> Any:
+    # json_extract returns JSON true/false as 1/0.
+    if isinstance(value, bool):
+        return int(value)
+    return value
@@ -0,0 +1,126 @@
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
+
+
+@dataclass
+class Settings:
+    """Runtime configuration for the aggregator.
+
+    Every field can be overridden from the environment as
+    ``AGGREGATOR_<FIELD_NAME>`` (e.g. ``AGGREGATOR_BATCH_SIZE=200``), which is
+    how uvicorn workers started from ``src.main:app`` get their config.
+    """
+
+    db_path: str = "./data/dedup.db"
+
+    # Consumer batching: drain up to batch_size events, waiting at most
+    # batch_wait_ms for the batch to fill before writing it.
+    batch_size: int = 100
+    batch_wait_ms: float = 5.0
+
+    # Ingest queue bounds (0 = unbounded) and what /publish does when full:
+    # "wait" up to enqueue_timeout_ms for space, or "reject" immediately.
+    queue_max_events: int = 100000
+    queue_max_bytes: int = 64 * 1024 * 1024
+    enqueue_on_full: str = "wait"
+    enqueue_timeout_ms: float = 1000.0
+    retry_after_seconds: int = 1
+    # Cap on the (decompressed) /publish request body.
+    max_body_bytes: int = 32 * 1024 * 1024
+
+    # Number of key-space shards, each with its own SQLite file and consumer.
+    # shared_counters keeps /stats counters in a SQLite file so they are exact
+    # across uvicorn worker processes.
+    shards: int = 1
+    shared_counters: bool = False
+
+    # Instrumentation: /metrics histograms, and the cap on per-event log
+    # lines per second (0 silences them).
+    metrics_enabled: bool = True
+    log_events_per_second: float = 10.0
+
+    # Payloads of at least this many bytes (as compact JSON) are stored
+    # zlib-compressed; 0 disables compression.
+    payload_compress_threshold: int = 4096
+
+    # Time-windowed retention: events are stored in partitions of partition_hours
+    # (by ingest time) and whole partitions older than retention_days are dropped.
+    # Duplicates are only detected within the window. 0 keeps everything forever.
+    retention_days: float = 0.0
+    partition_hours: float = 24.0
+    compaction_interval_seconds: float = 300.0
+    vacuum_step_pages: int = 256
+
+    # Durable spool: accepted chunks are appended to segment files under
+    # spool_dir/shard<N> before /publish answers, and replayed on startup.
+    # None disables it. spool_fsync is "batch", "interval" or "none".
+    spool_dir: Optional[str] = None
+    spool_fsync: str = "batch"
+    spool_fsync_interval_ms: float = 100.0
+    spool_segment_bytes: int = 64 * 1024 * 1024
+
+    # Read-only SQLite connections per shard (WAL only) and threads that run
+    # /events and /stats queries off the event loop; 0 reads through the writer connection.
+    read_pool_size: int = 4
+
+    # Page size of GET /events when the request has no limit; the full result
+    # is only returned with an explicit ?all=true.
+    events_page_size: int = 1000
+
+    # Live subscriptions (GET /subscribe): events kept per subscribed topic for resume,
+    # pending events per subscriber before it falls back to reading the store,
+    # and the SSE keep-alive interval.
+    subscription_buffer_size: int = 1024
+    subscriber_max_pending: int = 1000
+    subscription_keepalive_seconds: float = 15.0
+    # Topics keep their ring this long after the last subscriber leaves.
+    subscription_retain_seconds: float = 300.0
+
+    # Storage backend per shard: "sqlite" (DedupStore) or "bitcask" (append-only
+    # data files next to db_path, keydir in memory; no retention). Bitcask data
+    # files rotate at bitcask_max_file_bytes and the compaction task merges the
+    # immutable ones once there are bitcask_merge_min_files of them.
+    backend: str = "sqlite"
+    bitcask_max_file_bytes: int = 64 * 1024 * 1024
+    bitcask_merge_min_files: int = 4
+
+    # Cluster router (src/router.py): comma-separated aggregator node URLs,
+    # virtual nodes per node on the hash ring, and the pooled connections and
+    # timeout used to forward requests to the nodes.
+    router_nodes: Optional[str] = None
+    router_vnodes: int = 160
+    router_max_connections: int = 100
+    router_timeout_seconds: float = 30.0
+
+    # SQLite pragmas; None keeps the SQLite default. For the bitcask backend
+    # synchronous picks the fsync policy (OFF, NORMAL: on rotate, FULL: per batch).
+    journal_mode: Optional[str] = "WAL"
+    synchronous: Optional[str] = "NORMAL"
+
+    # In-memory duplicate pre-filter in front of SQLite; 0 disables a layer.
+    lru_size: int = 10000
+    bloom_capacity: int = 0
+    bloom_error_rate: float = 0.01
+
+    @classmethod
+    def from_env(cls, prefix: str = "AGGREGATOR_") -> "Settings":
+        values = {}
+        for f in fields(cls):
+            raw = os.environ.get(prefix + f.name.upper())
+            if raw is None:
+                continue
+            values[f.name] = _coerce(raw, f.default)
+        return cls(**values)
+
+
+def _coerce(raw: str, default):
+    if raw.lower() in ("", "none", "null"):
+        return None
+    if isinstance(default, bool):
+        return raw.lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    return raw
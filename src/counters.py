@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+
+class LocalCounters:
+    """Per-process counters held in a dict."""
+
+    # Cheap enough to call on the event loop.
+    blocking = False
+
+    def __init__(self, names: Iterable[str]):
+        self._values: Dict[str, int] = {name: 0 for name in names}
+
+    def add(self, **deltas: int):
+        for name, delta in deltas.items():
+            self._values[name] += delta
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self._values)
+
+    def close(self):
+        pass
+
+
+class SqliteCounters:
+    """Counters shared by every process that opens the same file.
+
+    Each ``add`` is one small transaction, so increments from concurrent
+    uvicorn workers never get lost. Values are cumulative across restarts.
+    Durability is not needed here, hence ``synchronous=OFF``.
+    """
+
+    # Every call is a SQLite transaction; keep it off the event loop.
+    blocking = True
+
+    def __init__(self, path: str, names: Iterable[str]):
+        self.path = path
+        self._names = list(names)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", [(n,) for n in self._names])
+        self._conn.commit()
+
+    def add(self, **deltas: int):
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE counters SET value = value + ? WHERE name = ?",
+                [(delta, name) for name, delta in deltas.items()],
+            )
+            self._conn.commit()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT name, value FROM counters").fetchall()
+        values = dict.fromkeys(self._names, 0)
+        values.update(rows)
+        return values
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,20 +1,79 @@
+import functools
 import sqlite3
 import threading
+import time
 import os
-from typing import List, Optional, Dict, Any
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Dict, Any, Tuple
 
+from .backend import EventStore
+from .codec import FORMAT_JSON, FORMAT_REPR, PayloadCodec, extract, payload_path, sql_value
+from .prefilter import DedupPrefilter
+from .readpool import ReadPool
 
-class DedupStore:
-    def __init__(self, db_path: str = "./data/dedup.db"):
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class DedupStore(EventStore):
+    """SQLite backend: one table (or time partitions) with a (topic, event_id) key."""
+
+    def __init__(
+        self,
+        db_path: str = "./data/dedup.db",
+        journal_mode: Optional[str] = None,
+        synchronous: Optional[str] = None,
+        lru_size: int = 0,
+        bloom_capacity: int = 0,
+        bloom_error_rate: float = 0.01,
+        payload_compress_threshold: int = 0,
+        retention_seconds: float = 0,
+        partition_seconds: float = 86400,
+        read_connections: int = 0,
+    ):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Pragmas cannot be bound as parameters, so only accept known values.
+        if journal_mode is not None and journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"Unsupported journal_mode: {journal_mode}")
+        if synchronous is not None and synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unsupported synchronous level: {synchronous}")
+        self.journal_mode = journal_mode.upper() if journal_mode else None
+        self.synchronous = synchronous.upper() if synchronous else None
         self._lock = threading.Lock()
         self._conn: Optional[sqlite3.Connection] = None
+        # Read-only connections for queries (WAL only); without them reads share
+        # the writer connection and its lock.
+        self.read_connections = read_connections
+        self._readers: Optional[ReadPool] = None
+        self.codec = PayloadCodec(payload_compress_threshold)
+        # Retention mode: rows go to time-bucketed partition tables (by ingest
+        # time) and only partitions inside the window are probed for duplicates.
+        self.retention_seconds = retention_seconds
+        self.partition_seconds = partition_seconds
+        self._clock = time.time
+        # (bucket, table name) in read order; the legacy events table sorts first.
+        self._partitions: List[Tuple[int, str]] = []
+        self._schema_version = -1
+        self.prefilter: Optional[DedupPrefilter] = None
+        if lru_size > 0 or bloom_capacity > 0:
+            self.prefilter = DedupPrefilter(lru_size, bloom_capacity, bloom_error_rate)
 
     def init_db(self):
         with self._lock:
             self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
             cur = self._conn.cursor()
+            if self.journal_mode:
+                cur.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            if self.synchronous:
+                cur.execute(f"PRAGMA synchronous={self.synchronous}")
+            if self.retention_seconds:
+                cur.execute("SELECT COUNT(*) FROM sqlite_master")
+                if cur.fetchone()[0] == 0:
+                    # Only takes effect on a fresh file; lets dropped partitions be
+                    # returned to the OS by incremental_vacuum().
+                    cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
             cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS events (
@@ -23,52 +82,550 @@ class DedupStore:
                     timestamp TEXT,
                     source TEXT,
                     payload TEXT,
+                    payload_format TEXT,
                     PRIMARY KEY (topic, event_id)
                 )
                 """
             )
+            cur.execute("PRAGMA table_info(events)")
+            if "payload_format" not in [r[1] for r in cur.fetchall()]:
+                # Databases from before the payload codec: existing rows keep a NULL
+                # format (legacy repr) until migrate_payloads() rewrites them.
+                cur.execute("ALTER TABLE events ADD COLUMN payload_format TEXT")
+            # SQLite appends the rowid to every index, so this is a (topic, rowid)
+            # index: per-topic keyset pages become a single range scan.
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_events_topic ON events (topic)")
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'topic_stats'")
+            backfill = cur.fetchone() is None
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS topic_stats (
+                    topic TEXT PRIMARY KEY,
+                    unique_count INTEGER NOT NULL DEFAULT 0,
+                    duplicate_count INTEGER NOT NULL DEFAULT 0,
+                    first_seen TEXT,
+                    last_seen TEXT,
+                    last_event_id TEXT
+                )
+                """
+            )
+            if backfill:
+                # Databases created before topic_stats existed: rebuild unique
+                # counts from the events table once. Duplicate counts were never
+                # persisted, so they start at zero.
+                cur.execute(
+                    """
+                    INSERT INTO topic_stats (topic, unique_count, last_event_id)
+                    SELECT topic, COUNT(*),
+                           (SELECT e2.event_id FROM events e2 WHERE e2.topic = e.topic ORDER BY e2.rowid DESC LIMIT 1)
+                    FROM events e GROUP BY topic
+                    """
+                )
+            if self.retention_seconds:
+                self._init_partitions(cur)
             self._conn.commit()
+            if self.prefilter is not None:
+                self._warm_prefilter(cur)
+            if self.read_connections > 0:
+                cur.execute("PRAGMA journal_mode")
+                if cur.fetchone()[0] == "wal":
+                    self._readers = ReadPool(self.db_path, self.read_connections)
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor for one read query: pooled when available, else the writer connection."""
+        if self._readers is not None:
+            with self._readers.cursor() as cur:
+                yield cur
+        else:
+            with self._lock:
+                yield self._conn.cursor()
+
+    # --- Retention partitions ---
 
-    def record_event(self, topic: str, event_id: str, timestamp: str, source: str, payload: Dict[str, Any]) -> bool:
-        """Try to record. Return True if new, False if duplicate."""
+    def _bucket(self, ts: float) -> int:
+        return int(ts // self.partition_seconds)
+
+    def _is_expired(self, bucket: int, now: float) -> bool:
+        # A partition expires once even its newest possible row is outside the window.
+        return (bucket + 1) * self.partition_seconds <= now - self.retention_seconds
+
+    def _tag_expired(self, bucket: Optional[int], now: float) -> bool:
+        """Prefilter tag check; keys tagged None (no retention) never expire."""
+        return bucket is not None and self._is_expired(bucket, now)
+
+    def _init_partitions(self, cur: sqlite3.Cursor):
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS partitions (
+                name TEXT PRIMARY KEY,
+                bucket INTEGER NOT NULL,
+                rows INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Rows written before retention was enabled have no ingest time; treat
+        # the legacy table as a partition that starts its window now.
+        cur.execute("SELECT 1 FROM events LIMIT 1")
+        if cur.fetchone() is not None:
+            cur.execute(
+                "INSERT OR IGNORE INTO partitions (name, bucket, rows) VALUES ('events', ?, (SELECT COUNT(*) FROM events))",
+                (self._bucket(self._clock()),),
+            )
+        self._refresh_partitions(cur, force=True)
+
+    def _refresh_partitions(self, cur: sqlite3.Cursor, force: bool = False):
+        """Reload the partition catalog if any process changed the schema."""
+        cur.execute("PRAGMA schema_version")
+        version = cur.fetchone()[0]
+        if not force and version == self._schema_version:
+            return
+        self._partitions = self._load_partitions(cur)
+        self._schema_version = version
+
+    @staticmethod
+    def _load_partitions(cur: sqlite3.Cursor) -> List[Tuple[int, str]]:
+        cur.execute("SELECT bucket, name FROM partitions")
+        return sorted(cur.fetchall(), key=lambda p: (p[0], p[1] != "events"))
+
+    def _current_partition(self, cur: sqlite3.Cursor, now: float) -> str:
+        self._refresh_partitions(cur)
+        bucket = self._bucket(now)
+        if self._partitions and self._partitions[-1][0] >= bucket:
+            # Never write behind the newest partition (clock skew, other workers),
+            # so seq ranges of the partitions stay in table order.
+            newest_bucket, newest = self._partitions[-1]
+            if newest != "events":
+                return newest
+            bucket = newest_bucket
+        name = f"events_p{bucket}"
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                seq INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                timestamp TEXT,
+                source TEXT,
+                payload TEXT,
+                payload_format TEXT,
+                UNIQUE (topic, event_id)
+            )
+            """
+        )
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_topic ON {name} (topic)")
+        cur.execute("INSERT OR IGNORE INTO partitions (name, bucket) VALUES (?, ?)", (name, bucket))
+        self._refresh_partitions(cur, force=True)
+        return name
+
+    def _read_tables(self, cur: Optional[sqlite3.Cursor] = None) -> List[str]:
+        """Tables holding events, oldest first; with ``cur`` the catalog is re-read."""
+        if not self.retention_seconds:
+            return ["events"]
+        partitions = self._partitions if cur is None else self._load_partitions(cur)
+        return [name for _, name in partitions]
+
+    def _next_seq(self, cur: sqlite3.Cursor, table: str) -> int:
+        # Runs inside the write transaction, so concurrent writers in other
+        # processes cannot hand out the same seq.
+        for name in [table] + [n for _, n in reversed(self._partitions) if n != table]:
+            cur.execute(f"SELECT MAX(rowid) FROM {name}")
+            last = cur.fetchone()[0]
+            if last is not None:
+                return last + 1
+        return 1
+
+    def drop_expired_partitions(self) -> List[str]:
+        """Drop every partition outside the window: one DROP TABLE each, no row deletes.
+
+        The dropped events are subtracted from ``topic_stats.unique_count`` in
+        the same transaction; duplicate counts and first/last seen stay lifetime values.
+        """
+        if not self.retention_seconds:
+            return []
+        now = self._clock()
         with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
             try:
-                cur = self._conn.cursor()
-                cur.execute(
-                    "INSERT INTO events (topic, event_id, timestamp, source, payload) VALUES (?, ?, ?, ?, ?)",
-                    (topic, event_id, timestamp, source, str(payload)),
+                self._refresh_partitions(cur)
+                expired = [name for bucket, name in self._partitions if self._is_expired(bucket, now)]
+                for name in expired:
+                    # unique_count covers retained events only; the per-topic
+                    # counts come from the (topic, rowid) index, not the rows.
+                    cur.execute(f"SELECT topic, COUNT(*) FROM {name} GROUP BY topic")
+                    cur.executemany(
+                        "UPDATE topic_stats SET unique_count = MAX(0, unique_count - ?) WHERE topic = ?",
+                        [(count, topic) for topic, count in cur.fetchall()],
+                    )
+                    cur.execute(f"DROP TABLE IF EXISTS {name}")
+                    cur.execute("DELETE FROM partitions WHERE name = ?", (name,))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            if expired:
+                self._refresh_partitions(cur, force=True)
+                if self.prefilter is not None:
+                    self.prefilter.forget_recent()
+            if "events" in expired:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS events (topic TEXT NOT NULL, event_id TEXT NOT NULL, timestamp TEXT, "
+                    "source TEXT, payload TEXT, payload_format TEXT, PRIMARY KEY (topic, event_id))"
                 )
                 self._conn.commit()
-                return True
-            except sqlite3.IntegrityError:
-                return False
+        return expired
+
+    def rebuild_prefilter(self, chunk_size: int = 10000) -> Iterator[int]:
+        """Refill the Bloom filter from the partitions still in the window.
 
-    def list_events(self, topic: Optional[str] = None) -> List[Dict[str, Any]]:
+        A generator: each step reads one chunk under the lock and yields its
+        size, so callers can interleave the steps with the consumer's writes.
+        """
+        with self._lock:
+            if self.prefilter is None or not self.prefilter.begin_rebuild():
+                return
+            tables = self._read_tables()
+        for table in tables:
+            after = 0
+            while True:
+                with self._lock:
+                    cur = self._conn.cursor()
+                    try:
+                        cur.execute(
+                            f"SELECT rowid, topic, event_id FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                            (after, chunk_size),
+                        )
+                    except sqlite3.OperationalError:
+                        # Dropped meanwhile: nothing left to carry over.
+                        break
+                    rows = cur.fetchall()
+                    self.prefilter.rebuild_add((r[1], r[2]) for r in rows)
+                if len(rows) < chunk_size:
+                    break
+                after = rows[-1][0]
+                yield len(rows)
+        with self._lock:
+            self.prefilter.finish_rebuild()
+
+    def incremental_vacuum(self, pages: int = 256) -> int:
+        """Return up to ``pages`` free pages to the OS; returns the pages still free."""
         with self._lock:
             cur = self._conn.cursor()
-            if topic:
-                cur.execute("SELECT topic,event_id,timestamp,source,payload FROM events WHERE topic = ? ORDER BY rowid", (topic,))
-            else:
-                cur.execute("SELECT topic,event_id,timestamp,source,payload FROM events ORDER BY rowid")
+            cur.execute("PRAGMA auto_vacuum")
+            if cur.fetchone()[0] != 2:
+                return 0
+            cur.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+            cur.fetchall()
+            cur.execute("PRAGMA freelist_count")
+            return cur.fetchone()[0]
+
+    def partition_stats(self) -> List[Dict[str, Any]]:
+        if not self.retention_seconds:
+            return []
+        now = self._clock()
+        with self._reader() as cur:
+            cur.execute("SELECT name, bucket, rows, bytes FROM partitions")
             rows = cur.fetchall()
-            return [
-                {
-                    "topic": r[0],
-                    "event_id": r[1],
-                    "timestamp": r[2],
-                    "source": r[3],
-                    "payload": r[4],
-                }
-                for r in rows
-            ]
+        return [
+            {
+                "name": r[0],
+                "start": datetime.fromtimestamp(r[1] * self.partition_seconds, timezone.utc).isoformat(),
+                "rows": r[2],
+                "approx_bytes": r[3],
+                "expired": self._is_expired(r[1], now),
+            }
+            for r in sorted(rows, key=lambda r: (r[1], r[0] != "events"))
+        ]
 
-    def list_topics(self) -> List[str]:
+    def _warm_prefilter(self, cur: sqlite3.Cursor):
+        # Oldest first, so the LRU ends up holding the most recent keys. Without a
+        # Bloom filter only the tail of the newest table is needed. Keys are tagged
+        # with their partition bucket (None without retention).
+        tables = self._read_tables()
+        buckets = {name: bucket for bucket, name in self._partitions}
+        if self.prefilter.bloom is None:
+            if not tables:
+                return
+            cur.execute(
+                f"SELECT topic, event_id FROM (SELECT rowid, topic, event_id FROM {tables[-1]} ORDER BY rowid DESC LIMIT ?) ORDER BY rowid",
+                (self.prefilter.recent.maxsize,),
+            )
+            bucket = buckets.get(tables[-1])
+            tables = []
+            for topic, event_id in cur.fetchall():
+                self.prefilter.add((topic, event_id), bucket)
+        for table in tables:
+            bucket = buckets.get(table)
+            cur.execute(f"SELECT topic, event_id FROM {table} ORDER BY rowid")
+            while True:
+                rows = cur.fetchmany(10000)
+                if not rows:
+                    break
+                for topic, event_id in rows:
+                    self.prefilter.add((topic, event_id), bucket)
+
+    def record_events_rowids(self, events: List[Dict[str, Any]]) -> List[Optional[int]]:
+        results: List[bool] = []
+        rowids: List[Optional[int]] = []
+        prefilter = self.prefilter
+        # (key, is_new, partition bucket holding it) for keys the prefilter should learn.
+        learned: List[Tuple[Tuple[str, str], bool, Optional[int]]] = []
+        expired: Optional[Callable[[Optional[int]], bool]] = None
         with self._lock:
             cur = self._conn.cursor()
-            cur.execute("SELECT DISTINCT topic FROM events")
+            # IMMEDIATE takes the write lock up front, so existence probes and
+            # inserts are atomic with respect to writers in other processes.
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if self.retention_seconds:
+                    now = self._clock()
+                    table = self._current_partition(cur, now)
+                    # Only partitions inside the window are probed; expired ones
+                    # are skipped even before compaction drops them.
+                    older = [n for b, n in self._partitions if n != table and not self._is_expired(b, now)]
+                    seq = self._next_seq(cur, table)
+                    written = 0
+                    buckets = {n: b for b, n in self._partitions}
+                    # LRU entries are tagged with their partition, so a key whose
+                    # partition left the window is not reported as a duplicate.
+                    expired = functools.partial(self._tag_expired, now=now)
+                else:
+                    table, older, seq, buckets = "events", [], None, {}
+                for ev in events:
+                    key = (ev["topic"], ev["event_id"])
+                    verdict = prefilter.classify(key, expired) if prefilter is not None else "unknown"
+                    if verdict == "duplicate":
+                        results.append(False)
+                        rowids.append(None)
+                        continue
+                    probe = older + [table] if verdict == "maybe" else older if verdict == "unknown" else []
+                    hit = next((name for name in probe if self._exists(cur, name, key)), None)
+                    if hit is not None:
+                        results.append(False)
+                        rowids.append(None)
+                        learned.append((key, False, buckets.get(hit)))
+                        continue
+                    if verdict == "maybe":
+                        prefilter.record_false_positive()
+                    payload, payload_format = self.codec.encode(ev.get("payload", {}))
+                    row = (ev["topic"], ev["event_id"], ev["timestamp"], ev.get("source", ""), payload, payload_format)
+                    if seq is None:
+                        cur.execute(
+                            "INSERT OR IGNORE INTO events (topic, event_id, timestamp, source, payload, payload_format) VALUES (?, ?, ?, ?, ?, ?)",
+                            row,
+                        )
+                    else:
+                        cur.execute(
+                            f"INSERT OR IGNORE INTO {table} (seq, topic, event_id, timestamp, source, payload, payload_format) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (seq, *row),
+                        )
+                    is_new = cur.rowcount == 1
+                    results.append(is_new)
+                    learned.append((key, is_new, buckets.get(table)))
+                    rowids.append((cur.lastrowid if seq is None else seq) if is_new else None)
+                    if is_new and seq is not None:
+                        seq += 1
+                        written += sum(len(v) for v in row[:4] if v) + len(payload)
+                if seq is not None:
+                    cur.execute(
+                        "UPDATE partitions SET rows = rows + ?, bytes = bytes + ? WHERE name = ?",
+                        (sum(results), written, table),
+                    )
+                self._update_topic_stats(cur, events, results)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            if prefilter is not None:
+                for key, is_new, bucket in learned:
+                    if is_new:
+                        prefilter.add(key, bucket)
+                    else:
+                        prefilter.seen(key, bucket)
+        return rowids
+
+    def last_rowid(self) -> int:
+        """Newest rowid in the store (0 when empty)."""
+        with self._reader() as cur:
+            for table in reversed(self._read_tables(cur)):
+                cur.execute(f"SELECT MAX(rowid) FROM {table}")
+                last = cur.fetchone()[0]
+                if last is not None:
+                    return last
+        return 0
+
+    @staticmethod
+    def _exists(cur: sqlite3.Cursor, table: str, key: Tuple[str, str]) -> bool:
+        cur.execute(f"SELECT 1 FROM {table} WHERE topic = ? AND event_id = ?", key)
+        return cur.fetchone() is not None
+
+    def _update_topic_stats(self, cur: sqlite3.Cursor, events: List[Dict[str, Any]], results: List[bool]):
+        """Fold one batch into topic_stats, inside the caller's transaction."""
+        now = datetime.now(timezone.utc).isoformat()
+        deltas: Dict[str, List[Any]] = {}
+        for ev, is_new in zip(events, results):
+            delta = deltas.setdefault(ev["topic"], [0, 0, None])
+            if is_new:
+                delta[0] += 1
+                delta[2] = ev["event_id"]
+            else:
+                delta[1] += 1
+        cur.executemany(
+            """
+            INSERT INTO topic_stats (topic, unique_count, duplicate_count, first_seen, last_seen, last_event_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(topic) DO UPDATE SET
+                unique_count = unique_count + excluded.unique_count,
+                duplicate_count = duplicate_count + excluded.duplicate_count,
+                first_seen = COALESCE(first_seen, excluded.first_seen),
+                last_seen = excluded.last_seen,
+                last_event_id = COALESCE(excluded.last_event_id, last_event_id)
+            """,
+            [(topic, d[0], d[1], now, now, d[2]) for topic, d in deltas.items()],
+        )
+
+    def topic_stats(self) -> List[Dict[str, Any]]:
+        """Per-topic counters, read from the summary table in O(topics)."""
+        with self._reader() as cur:
+            cur.execute(
+                "SELECT topic, unique_count, duplicate_count, first_seen, last_seen, last_event_id FROM topic_stats ORDER BY topic"
+            )
+            rows = cur.fetchall()
+        return [
+            {
+                "topic": r[0],
+                "unique_count": r[1],
+                "duplicate_count": r[2],
+                "first_seen": r[3],
+                "last_seen": r[4],
+                "last_event_id": r[5],
+            }
+            for r in rows
+        ]
+
+    def prefilter_stats(self) -> Optional[Dict[str, int]]:
+        if self.prefilter is None:
+            return None
+        # No lock: the writer holds it for a whole batch, and copying a dict of
+        # ints plus a few len()s is safe against a concurrent writer under the GIL.
+        return self.prefilter.stats()
+
+    def list_events_page(
+        self,
+        topic: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: int = 0,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """Keyset page of ``(rowid, event)`` pairs with rowid > ``after``, in rowid order.
+
+        ``since``/``until`` bound the event ``timestamp`` (inclusive, compared as
+        ISO-8601 strings). ``payload_filters`` maps dotted payload fields to
+        required values; JSON rows are filtered by ``json_extract`` in SQLite,
+        compressed and legacy rows after decoding. A page shorter than
+        ``limit`` means there are no more matching rows.
+        """
+        sql = " WHERE rowid > ?"
+        params: List[Any] = []
+        if topic:
+            sql += " AND topic = ?"
+            params.append(topic)
+        if since:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        if until:
+            sql += " AND timestamp <= ?"
+            params.append(until)
+        filters = list((payload_filters or {}).items())
+        for field, value in filters:
+            # CASE keeps json_extract away from rows that are not plain JSON.
+            sql += " AND CASE WHEN payload_format = ? THEN json_extract(payload, ?) IS ? ELSE 1 END"
+            params.extend([FORMAT_JSON, payload_path(field), sql_value(value)])
+        sql += " ORDER BY rowid"
+        if limit is not None:
+            sql += " LIMIT ?"
+
+        with self._reader() as cur:
+            tables = self._read_tables(cur)
+
+        # Partitions hold increasing, disjoint rowid ranges, so reading them in
+        # order yields one rowid-ordered stream.
+        page: List[Tuple[int, Dict[str, Any]]] = []
+        for table in tables:
+            select = f"SELECT rowid,topic,event_id,timestamp,source,payload,payload_format FROM {table}" + sql
+            while True:
+                want = None if limit is None else limit - len(page)
+                with self._reader() as cur:
+                    try:
+                        cur.execute(select, [after, *params] + ([want] if want is not None else []))
+                    except sqlite3.OperationalError:
+                        if table == "events" or not self.retention_seconds:
+                            raise
+                        # Partition dropped by compaction after the table list was read.
+                        break
+                    rows = cur.fetchall()
+                for r in rows:
+                    payload = self.codec.decode(r[5], r[6])
+                    if r[6] != FORMAT_JSON and any(extract(payload, f) != v for f, v in filters):
+                        continue
+                    page.append(
+                        (
+                            r[0],
+                            {
+                                "topic": r[1],
+                                "event_id": r[2],
+                                "timestamp": r[3],
+                                "source": r[4],
+                                "payload": payload,
+                            },
+                        )
+                    )
+                if want is not None and len(page) >= limit:
+                    return page
+                # Rows dropped by the Python-side filter leave the page short: keep reading.
+                if want is None or len(rows) < want:
+                    break
+                after = rows[-1][0]
+        return page
+
+    def migrate_payloads(self, batch_size: int = 1000) -> int:
+        """Rewrite legacy repr payloads with the current codec, one batch per transaction.
+
+        Rows whose repr cannot be parsed are tagged ``repr`` and left as they
+        are. Returns the number of rows visited.
+        """
+        migrated = 0
+        while True:
+            with self._lock:
+                cur = self._conn.cursor()
+                cur.execute("SELECT rowid, payload FROM events WHERE payload_format IS NULL LIMIT ?", (batch_size,))
+                rows = cur.fetchall()
+                if not rows:
+                    return migrated
+                updates = []
+                for rowid, raw in rows:
+                    payload = self.codec.decode(raw, None)
+                    if isinstance(payload, dict):
+                        updates.append((*self.codec.encode(payload), rowid))
+                    else:
+                        updates.append((raw, FORMAT_REPR, rowid))
+                cur.executemany("UPDATE events SET payload = ?, payload_format = ? WHERE rowid = ?", updates)
+                self._conn.commit()
+                migrated += len(rows)
+
+    def list_topics(self) -> List[str]:
+        with self._reader() as cur:
+            cur.execute("SELECT topic FROM topic_stats ORDER BY topic")
             return [r[0] for r in cur.fetchall()]
 
     def close(self):
+        if self._readers is not None:
+            self._readers.close()
+            self._readers = None
         if self._conn:
             self._conn.close()
             self._conn = None
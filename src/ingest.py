@@ -0,0 +1,147 @@
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import StringConstraints, TypeAdapter, ValidationError
+from typing_extensions import Annotated, TypedDict
+
+
+# Upper bound for topic and event_id, in characters. Keys are stored and
+# compared on every write; at 4 bytes per character this also stays inside
+# the 16-bit key lengths of the bitcask backend.
+MAX_KEY_LENGTH = 1024
+
+Key = Annotated[str, StringConstraints(max_length=MAX_KEY_LENGTH)]
+
+
+class EventRecord(TypedDict):
+    """Same schema as ``EventModel``, validated straight into a plain dict."""
+
+    topic: Key
+    event_id: Key
+    timestamp: str
+    source: str
+    payload: Dict[str, Any]
+
+
+_event_adapter = TypeAdapter(EventRecord)
+_batch_adapter = TypeAdapter(List[EventRecord])
+
+
+class InvalidBody(ValueError):
+    """The request body is not usable at all (bad JSON, wrong shape, bad encoding)."""
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def _format_errors(errors: List[Dict[str, Any]], skip: int = 0) -> List[Dict[str, Any]]:
+    return [{"loc": list(e["loc"][skip:]), "msg": e["msg"], "type": e["type"]} for e in errors]
+
+
+def validate_event_json(raw: bytes) -> EventRecord:
+    """Parse and validate one JSON event in a single pass; raises ValidationError."""
+    return _event_adapter.validate_json(raw)
+
+
+def validate_batch(raw: bytes) -> Tuple[List[Tuple[int, EventRecord]], List[Dict[str, Any]]]:
+    """Parse and validate a single event or an array of events.
+
+    The whole array is parsed and validated in one pass by pydantic-core. Only
+    when some records are invalid is the batch revisited per record, so a bad
+    record is reported by index instead of failing the whole batch.
+
+    Returns ``(valid, invalid)`` where ``valid`` holds ``(index, event)`` pairs
+    and ``invalid`` holds ``{"index", "errors"}`` entries.
+    """
+    head = raw.lstrip()[:1]
+    if head == b"{":
+        try:
+            return [(0, _event_adapter.validate_json(raw))], []
+        except ValidationError as e:
+            errors = e.errors(include_url=False, include_input=False)
+            if any(err["type"] == "json_invalid" for err in errors):
+                raise InvalidBody("Invalid JSON format")
+            return [], [{"index": 0, "errors": _format_errors(errors)}]
+    if head != b"[":
+        try:
+            json.loads(raw)
+        except ValueError:
+            raise InvalidBody("Invalid JSON format")
+        raise InvalidBody("JSON must be a single object or an array of objects")
+
+    try:
+        return list(enumerate(_batch_adapter.validate_json(raw))), []
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_input=False)
+    if any(err["type"] == "json_invalid" or not err["loc"] for err in errors):
+        raise InvalidBody("Invalid JSON format")
+
+    by_index: Dict[int, List[Dict[str, Any]]] = {}
+    for err in errors:
+        by_index.setdefault(err["loc"][0], []).append(err)
+    items = json.loads(raw)
+    valid = [
+        (i, _event_adapter.validate_python(item)) for i, item in enumerate(items) if i not in by_index
+    ]
+    invalid = [{"index": i, "errors": _format_errors(errs, skip=1)} for i, errs in sorted(by_index.items())]
+    return valid, invalid
+
+
+class BodyDecoder:
+    """Incremental ``Content-Encoding`` decoder with a cap on the decoded size."""
+
+    def __init__(self, encoding: Optional[str], max_bytes: int = 0):
+        encoding = (encoding or "identity").strip().lower()
+        if encoding in ("gzip", "x-gzip"):
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._zlib = zlib.decompressobj()
+        elif encoding == "identity":
+            self._zlib = None
+        else:
+            raise InvalidBody(f"Unsupported Content-Encoding: {encoding}")
+        self.max_bytes = max_bytes
+        self.decoded = 0
+
+    def decode(self, chunk: bytes) -> bytes:
+        if self._zlib is not None:
+            try:
+                # Bounded output per call guards against decompression bombs.
+                limit = self.max_bytes - self.decoded + 1 if self.max_bytes else 0
+                out = self._zlib.decompress(chunk, limit)
+            except zlib.error:
+                raise InvalidBody("Malformed compressed body")
+            if self._zlib.unconsumed_tail:
+                raise BodyTooLarge("Request body too large")
+        else:
+            out = chunk
+        self.decoded += len(out)
+        if self.max_bytes and self.decoded > self.max_bytes:
+            raise BodyTooLarge("Request body too large")
+        return out
+
+    def flush(self) -> bytes:
+        if self._zlib is None:
+            return b""
+        if not self._zlib.eof and self.decoded:
+            raise InvalidBody("Truncated compressed body")
+        return self._zlib.flush()
+
+
+class LineSplitter:
+    """Split a byte stream into lines as chunks arrive."""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        data = self._pending + chunk
+        lines = data.split(b"\n")
+        self._pending = lines.pop()
+        return lines
+
+    def finish(self) -> List[bytes]:
+        rest, self._pending = self._pending, b""
+        return [rest] if rest else []
@@ -0,0 +1,138 @@
+import asyncio
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Optional, Tuple
+
+
+class EventQueue:
+    """asyncio queue bounded by event count and by approximate bytes.
+
+    Each item carries its own weight (``count`` events, ``nbytes`` bytes) so a
+    whole batch can be queued as one item. A limit of 0 means unbounded. An
+    item always fits into an empty queue, so an oversized batch cannot stall
+    ingestion forever.
+    """
+
+    def __init__(self, max_events: int = 0, max_bytes: int = 0):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        # (item, count, nbytes, enqueued_at per time.perf_counter())
+        self._items: Deque[Tuple[Any, int, int, float]] = deque()
+        self._events = 0
+        self._bytes = 0
+        self._unfinished = 0
+        self._has_items = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+
+    def qsize(self) -> int:
+        """Number of events (not items) currently queued."""
+        return self._events
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def fits(self, count: int = 1, nbytes: int = 0) -> bool:
+        if not self._items:
+            return True
+        if self.max_events and self._events + count > self.max_events:
+            return False
+        if self.max_bytes and self._bytes + nbytes > self.max_bytes:
+            return False
+        return True
+
+    def room(self, nbytes_per_event: int = 0) -> int:
+        """How many more events of the given size fit right now."""
+        free = []
+        if self.max_events:
+            free.append(self.max_events - self._events)
+        if self.max_bytes and nbytes_per_event:
+            free.append((self.max_bytes - self._bytes) // nbytes_per_event)
+        return max(0, min(free)) if free else sys.maxsize
+
+    def put_nowait(self, item: Any, count: int = 1, nbytes: int = 0) -> bool:
+        """Queue the item if it fits right now; return whether it was queued."""
+        if not self.fits(count, nbytes):
+            return False
+        self._push(item, count, nbytes)
+        return True
+
+    async def put(self, item: Any, count: int = 1, nbytes: int = 0, timeout: Optional[float] = None) -> bool:
+        """Queue the item, waiting up to ``timeout`` seconds for space.
+
+        ``timeout=None`` waits indefinitely; ``timeout<=0`` never waits.
+        """
+        if self.put_nowait(item, count, nbytes):
+            return True
+        if timeout is not None and timeout <= 0:
+            return False
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not self.fits(count, nbytes):
+            self._has_space.clear()
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._has_space.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        self._push(item, count, nbytes)
+        return True
+
+    async def wait_for_space(self, timeout: Optional[float] = None) -> bool:
+        """Wait until an item is taken from the queue; False on timeout."""
+        self._has_space.clear()
+        try:
+            await asyncio.wait_for(self._has_space.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def get_nowait(self) -> Any:
+        return self.get_nowait_timed()[0]
+
+    async def get(self) -> Any:
+        return (await self.get_timed())[0]
+
+    def get_nowait_timed(self) -> Tuple[Any, float]:
+        """Like ``get_nowait`` but also return when the item was queued."""
+        if not self._items:
+            raise asyncio.QueueEmpty
+        item, count, nbytes, enqueued_at = self._items.popleft()
+        self._events -= count
+        self._bytes -= nbytes
+        self._has_space.set()
+        if not self._items:
+            self._has_items.clear()
+        return item, enqueued_at
+
+    async def get_timed(self) -> Tuple[Any, float]:
+        while not self._items:
+            self._has_items.clear()
+            await self._has_items.wait()
+        return self.get_nowait_timed()
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._all_done.set()
+
+    async def join(self) -> None:
+        await self._all_done.wait()
+
+    def _push(self, item: Any, count: int, nbytes: int) -> None:
+        self._items.append((item, count, nbytes, time.perf_counter()))
+        self._events += count
+        self._bytes += nbytes
+        self._unfinished += 1
+        self._all_done.clear()
+        self._has_items.set()
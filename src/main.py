@@ -1,12 +1,28 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, Union
 import asyncio
+import functools
+import json
 import uvicorn
 import time
 import logging
-from .dedup import DedupStore  # Pastikan Anda punya file ini di src/dedup.py
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import sqlite3
+from .config import Settings
+from .codec import filter_value, payload_path
+from .counters import LocalCounters, SqliteCounters
+from .backend import create_store
+from .ingest import MAX_KEY_LENGTH, BodyDecoder, BodyTooLarge, InvalidBody, LineSplitter, validate_batch, validate_event_json
+from .ingest_queue import EventQueue
+from .metrics import CallbackMetric, Metrics, RateLimitedLogger
+from .sharding import Shard, ShardedStore, format_cursor, parse_cursor, shard_for, shard_paths
+from .spool import Spool, claim_spool, orphaned_spools
+from .subscriptions import SubscriptionHub, read_backlog
 from contextlib import asynccontextmanager
 
 # --- Konfigurasi Logging ---
@@ -16,16 +32,22 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Backoff saat penulisan batch ke store gagal (lihat write_batch).
+WRITE_RETRY_INITIAL_SECONDS = 0.1
+WRITE_RETRY_MAX_SECONDS = 5.0
+
 # --- Model Data Pydantic ---
 class EventModel(BaseModel):
-    topic: str
-    event_id: str
+    topic: str = Field(max_length=MAX_KEY_LENGTH)
+    event_id: str = Field(max_length=MAX_KEY_LENGTH)
     timestamp: str
     source: str
     payload: Dict[str, Any]
 
 # --- Fungsi Pabrik Aplikasi (Factory Function) ---
-def create_app(db_path: str = "./data/dedup.db"):
+def create_app(db_path: Optional[str] = None, settings: Optional[Settings] = None):
+    settings = settings or Settings()
+    db_path = db_path or settings.db_path
     app = FastAPI(title="UTS Log Aggregator")
 
     # --- Middleware untuk CORS (opsional tapi baik untuk pengembangan) ---
@@ -38,14 +60,56 @@ def create_app(db_path: str = "./data/dedup.db"):
     )
 
     # --- Inisialisasi State Aplikasi ---
+    app.state.settings = settings
     app.state.start_time = time.time()
-    app.state.queue = asyncio.Queue()
-    app.state.store = DedupStore(db_path)
-    app.state.counters = {
-        "received": 0,
-        "unique_processed": 0,
-        "duplicate_dropped": 0,
-    }
+    # Setiap shard punya store sendiri (SQLite atau Bitcask, lihat settings.backend),
+    # antrian, thread writer, dan consumer sendiri.
+    # Kapasitas antrian dibagi rata ke semua shard.
+    num_shards = max(1, settings.shards)
+    app.state.shards = [
+        Shard(
+            index=i,
+            store=create_store(path, settings),
+            queue=EventQueue(
+                max_events=math.ceil(settings.queue_max_events / num_shards),
+                max_bytes=math.ceil(settings.queue_max_bytes / num_shards),
+            ),
+        )
+        for i, path in enumerate(shard_paths(db_path, num_shards))
+    ]
+    app.state.store = ShardedStore([shard.store for shard in app.state.shards])
+    app.state.hub = SubscriptionHub(
+        num_shards,
+        settings.subscription_buffer_size,
+        settings.subscriber_max_pending,
+        settings.subscription_retain_seconds,
+    )
+    counter_names = ("received", "unique_processed", "duplicate_dropped", "write_failed")
+    if settings.shared_counters:
+        # Dipakai bersama oleh semua proses uvicorn (--workers N) yang memakai db_path yang sama.
+        app.state.counters = SqliteCounters(os.path.splitext(db_path)[0] + ".counters.db", counter_names)
+    else:
+        app.state.counters = LocalCounters(counter_names)
+    # Snapshot terakhir untuk /metrics; diperbarui sebelum setiap render.
+    app.state.counters_snapshot = dict.fromkeys(counter_names, 0)
+
+    # --- Instrumentasi ---
+    metrics = Metrics(enabled=settings.metrics_enabled)
+    app.state.metrics = metrics
+    # Log per event dibatasi agar logging tidak menjadi biaya utama di hot path.
+    app.state.event_log = RateLimitedLogger(logger, settings.log_events_per_second)
+    metrics.register_callback(CallbackMetric(
+        "aggregator_queue_depth_events", "Events waiting in the ingest queue.", "gauge",
+        lambda: [((str(shard.index),), shard.queue.qsize()) for shard in app.state.shards], ("shard",),
+    ))
+    metrics.register_callback(CallbackMetric(
+        "aggregator_queue_depth_bytes", "Approximate bytes waiting in the ingest queue.", "gauge",
+        lambda: [((str(shard.index),), shard.queue.nbytes) for shard in app.state.shards], ("shard",),
+    ))
+    metrics.register_callback(CallbackMetric(
+        "aggregator_events_total", "Events by outcome.", "counter",
+        lambda: [((name,), value) for name, value in app.state.counters_snapshot.items()], ("outcome",),
+    ))
 
     # --- Lifespan Manager untuk Startup dan Shutdown ---
     @asynccontextmanager
@@ -53,108 +117,687 @@ def create_app(db_path: str = "./data/dedup.db"):
         # --- Proses Startup ---
         logger.info("🚀 Aplikasi memulai proses startup...")
         app.state.store.init_db()
-        app.state.consumer_task = asyncio.create_task(consumer_loop(app))
-        logger.info("✅ Consumer worker telah dimulai.")
+        # Query baca berjalan di thread terpisah dengan koneksi read-only, sehingga query
+        # /events yang berat tidak memblokir event loop maupun consumer.
+        app.state.readers = ThreadPoolExecutor(max_workers=max(1, settings.read_pool_size), thread_name_prefix="dedup-reader")
+        loop = asyncio.get_running_loop()
+        for shard in app.state.shards:
+            # Semua penulisan SQLite per shard berjalan di satu thread writer khusus, bukan di event loop.
+            shard.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"dedup-writer-{shard.index}")
+            if settings.spool_dir:
+                # Event yang sudah diterima tapi belum tersimpan sebelum crash/redeploy diputar ulang dulu.
+                replayed = await replay_spool(app, shard)
+                if replayed:
+                    logger.info(f"♻️ Shard {shard.index}: {replayed} event diputar ulang dari spool.")
+                shard.spool_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"spool-writer-{shard.index}")
+        # Setelah replay: baris yang ditulis replay sudah ada di store, bukan di ring hub.
+        app.state.hub.start([shard.store.last_rowid() for shard in app.state.shards])
+        for shard in app.state.shards:
+            shard.task = asyncio.create_task(consumer_loop(app, shard))
+        logger.info(f"✅ {len(app.state.shards)} consumer worker telah dimulai.")
+        compaction = None
+        if settings.retention_days or settings.backend == "bitcask":
+            compaction = asyncio.create_task(compaction_loop(app))
+        spool_flusher = None
+        if settings.spool_dir and settings.spool_fsync == "interval":
+            spool_flusher = asyncio.create_task(spool_flush_loop(app))
         
         yield  # Aplikasi berjalan di sini
         
         # --- Proses Shutdown ---
         logger.info("👋 Aplikasi memulai proses shutdown...")
-        app.state.consumer_task.cancel()
-        try:
-            await app.state.consumer_task
-        except asyncio.CancelledError:
-            logger.info("Consumer worker berhasil dihentikan.")
+        for task in (compaction, spool_flusher):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for shard in app.state.shards:
+            shard.task.cancel()
+        for shard in app.state.shards:
+            try:
+                await shard.task
+            except asyncio.CancelledError:
+                pass
+            shard.writer.shutdown(wait=True)
+            if shard.spool is not None:
+                # Event yang masih di antrian tetap ada di spool dan diputar ulang saat startup berikutnya.
+                shard.spool_writer.shutdown(wait=True)
+                shard.spool.close()
+        logger.info("Consumer worker berhasil dihentikan.")
+        app.state.readers.shutdown(wait=True)
         app.state.store.close()
+        app.state.counters.close()
         logger.info(" koneksi database ditutup.")
 
     app.router.lifespan_context = lifespan
 
     # --- Endpoint API ---
+
+    async def read(fn, *args):
+        """Menjalankan query baca di thread pool pembaca dan menunggu hasilnya."""
+        return await asyncio.get_running_loop().run_in_executor(app.state.readers, fn, *args)
     
+    def enqueue_timeout(on_full: Optional[str], wait_ms: Optional[float]) -> float:
+        on_full = on_full or settings.enqueue_on_full
+        if on_full not in ("wait", "reject"):
+            raise HTTPException(status_code=400, detail="on_full must be 'wait' or 'reject'")
+        return 0.0 if on_full == "reject" else (settings.enqueue_timeout_ms if wait_ms is None else wait_ms) / 1000
+
+    async def enqueue(indexed: List[Tuple[int, Dict[str, Any], int]], timeout: float) -> Tuple[List[int], List[int]]:
+        """Memasukkan event tervalidasi ke antrian shard sebagai item batch.
+
+        `indexed` berisi (indeks, event, perkiraan byte). Kelompok event per shard
+        masuk sebagai satu item jika muat; jika tidak, dimasukkan sebanyak ruang
+        yang tersedia sambil menunggu consumer hingga batas waktu. Mengembalikan
+        (indeks yang masuk antrian, indeks yang ditolak).
+        """
+        shards = app.state.shards
+        groups: Dict[int, List[Tuple[int, Dict[str, Any], int]]] = {}
+        for entry in indexed:
+            groups.setdefault(shard_for(entry[1]["topic"], entry[1]["event_id"], len(shards)), []).append(entry)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        queued: List[int] = []
+        rejected: List[int] = []
+        appends = []
+        for shard_index, group in groups.items():
+            queue = shards[shard_index].queue
+            spool = shards[shard_index].spool
+            event_bytes = max(1, sum(entry[2] for entry in group) // len(group))
+            pos = 0
+            while pos < len(group):
+                fit = min(len(group) - pos, queue.room(event_bytes))
+                if fit == 0 and queue.empty():
+                    # Satu event yang lebih besar dari kapasitas tetap boleh masuk antrian kosong.
+                    fit = 1
+                if fit == 0:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0 or not await queue.wait_for_space(remaining):
+                        break
+                    continue
+                chunk = group[pos:pos + fit]
+                events = [entry[1] for entry in chunk]
+                queue.put_nowait(events, count=fit, nbytes=fit * event_bytes)
+                if spool is not None:
+                    # Tiket dipesan bersamaan dengan put agar urutannya sama dengan urutan antrian.
+                    appends.append(loop.run_in_executor(
+                        shards[shard_index].spool_writer, spool.append, spool.reserve(), events
+                    ))
+                queued.extend(entry[0] for entry in chunk)
+                pos += fit
+            # Shard ini penuh; event untuk shard lain tetap diproses.
+            rejected.extend(entry[0] for entry in group[pos:])
+        queued.sort()
+        # PERBAIKAN 2: Counter 'received' diinkremen di sini saat diterima
+        await add_counters(app, None, received=len(queued))
+        if appends:
+            started = time.perf_counter() if metrics.enabled else 0.0
+            try:
+                await asyncio.gather(*appends)
+            except OSError as e:
+                logger.error(f"Gagal menulis spool: {e}")
+                raise HTTPException(status_code=503, detail="Spool write failed")
+            if metrics.enabled:
+                metrics.observe_stage("spool_append", time.perf_counter() - started)
+        return queued, rejected
+
+    def publish_response(total: int, queued: List[int], events: Dict[int, Dict[str, Any]], invalid: List[Dict[str, Any]]):
+        if invalid and not events:
+            return JSONResponse(status_code=422, content={"detail": "Schema validation error", "invalid": invalid})
+        if len(queued) == len(events):
+            content = {"message": f"{len(queued)} event(s) were accepted into the queue.", "accepted": len(queued)}
+            if invalid:
+                content["invalid"] = invalid
+            return JSONResponse(status_code=202, content=content)
+        return JSONResponse(
+            status_code=429 if queued else 503,
+            headers={"Retry-After": str(settings.retry_after_seconds)},
+            content={
+                "message": f"Queue is full: {len(queued)} of {total} event(s) were accepted.",
+                "accepted": len(queued),
+                "rejected": total - len(queued),
+                "queued": [{"index": i, "topic": events[i]["topic"], "event_id": events[i]["event_id"]} for i in queued],
+                "invalid": invalid,
+            },
+        )
+
     # PERBAIKAN 1: Menambahkan status_code=202 Accepted
     @app.post("/publish", status_code=202)
-    async def publish(request: Request):
-        """Menerima satu atau batch event JSON dan memasukkannya ke antrian."""
+    async def publish(request: Request, on_full: Optional[str] = None, wait_ms: Optional[float] = None):
+        """Menerima satu atau batch event JSON dan memasukkannya ke antrian.
+
+        Seluruh batch di-parse dan divalidasi dalam satu langkah; event yang tidak
+        valid dilaporkan per indeks di `invalid` tanpa menolak event lain. Body
+        boleh dikompresi (`Content-Encoding: gzip`).
+
+        Jika antrian penuh, `on_full=wait` (default) menunggu hingga `wait_ms`
+        milidetik, sedangkan `on_full=reject` langsung menolak. Event yang tidak
+        masuk antrian dilaporkan dengan status 429 (sebagian diterima) atau 503
+        (tidak ada yang diterima) beserta header `Retry-After`.
+        """
+        timeout = enqueue_timeout(on_full, wait_ms)
+        timed = metrics.enabled
+        t0 = time.perf_counter() if timed else 0.0
         try:
-            body = await request.json()
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid JSON format")
-
-        events_to_process = []
-        if isinstance(body, dict):
-            events_to_process = [body]
-        elif isinstance(body, list):
-            events_to_process = body
-        else:
-            raise HTTPException(status_code=400, detail="JSON must be a single object or an array of objects")
-
-        accepted_count = 0
-        for raw_event in events_to_process:
-            try:
-                event_model = EventModel(**raw_event)
-                # Gunakan model_dump() untuk Pydantic v2
-                await app.state.queue.put(event_model.model_dump())
-                
-                # PERBAIKAN 2: Counter 'received' diinkremen di sini saat diterima
-                app.state.counters["received"] += 1
-                
-                accepted_count += 1
-            except ValidationError as e:
-                # Jika validasi gagal, hentikan proses dan kembalikan error
-                raise HTTPException(status_code=422, detail=f"Schema validation error: {e}")
-
-        return {"message": f"{accepted_count} event(s) were accepted into the queue."}
+            decoder = BodyDecoder(request.headers.get("content-encoding"), settings.max_body_bytes)
+            chunks = [decoder.decode(chunk) async for chunk in request.stream()]
+            chunks.append(decoder.flush())
+            raw_body = b"".join(chunks)
+        except BodyTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except InvalidBody as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if timed:
+            t1 = time.perf_counter()
+            metrics.observe_stage("parse", t1 - t0)
+            t0 = t1
+
+        try:
+            valid, invalid = validate_batch(raw_body)
+        except InvalidBody as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if timed:
+            t1 = time.perf_counter()
+            metrics.observe_stage("validate", t1 - t0)
+            t0 = t1
+
+        total = len(valid) + len(invalid)
+        # Perkiraan ukuran per event di memori, cukup untuk membatasi antrian berdasarkan byte.
+        event_bytes = max(1, len(raw_body) // max(1, total))
+        queued, _ = await enqueue([(i, ev, event_bytes) for i, ev in valid], timeout) if valid else ([], [])
+        if timed:
+            metrics.observe_stage("enqueue", time.perf_counter() - t0)
+        return publish_response(total, queued, dict(valid), invalid)
+
+    @app.post("/publish/ndjson", status_code=202)
+    async def publish_ndjson(request: Request, on_full: Optional[str] = None, wait_ms: Optional[float] = None):
+        """Menerima event dalam format NDJSON (satu objek JSON per baris).
+
+        Body di-parse bertahap selama diterima dan dimasukkan ke antrian per
+        potongan `batch_size` event, sehingga body besar tidak perlu dimuat utuh
+        ke memori. `index` pada respons adalah nomor baris (mulai dari 0).
+
+        Jika body ternyata terlalu besar (413) atau rusak (400) di tengah stream,
+        respons error tetap berisi `accepted` dan `queued` untuk potongan yang
+        sudah masuk antrian sebelumnya.
+        """
+        timeout = enqueue_timeout(on_full, wait_ms)
+        try:
+            decoder = BodyDecoder(request.headers.get("content-encoding"), settings.max_body_bytes)
+        except InvalidBody as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        splitter = LineSplitter()
+        chunk_size = max(1, settings.batch_size)
+        pending: List[Tuple[int, Dict[str, Any], int]] = []
+        events: Dict[int, Dict[str, Any]] = {}
+        queued: List[int] = []
+        invalid: List[Dict[str, Any]] = []
+        line_no = 0
+
+        def take(lines: List[bytes]):
+            nonlocal line_no
+            t0 = time.perf_counter() if metrics.enabled else 0.0
+            for line in lines:
+                index, line_no = line_no, line_no + 1
+                if not line.strip():
+                    continue
+                try:
+                    ev = validate_event_json(line)
+                except ValidationError as e:
+                    errors = e.errors(include_url=False, include_input=False)
+                    invalid.append({"index": index, "errors": [{"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]} for err in errors]})
+                    continue
+                events[index] = ev
+                pending.append((index, ev, len(line)))
+            if metrics.enabled:
+                metrics.observe_stage("validate", time.perf_counter() - t0)
+
+        async def flush():
+            t0 = time.perf_counter() if metrics.enabled else 0.0
+            done, _ = await enqueue(pending, timeout)
+            queued.extend(done)
+            pending.clear()
+            if metrics.enabled:
+                metrics.observe_stage("enqueue", time.perf_counter() - t0)
+
+        try:
+            async for chunk in request.stream():
+                take(splitter.feed(decoder.decode(chunk)))
+                if len(pending) >= chunk_size:
+                    await flush()
+            take(splitter.feed(decoder.flush()) + splitter.finish())
+        except (BodyTooLarge, InvalidBody) as e:
+            # Potongan sebelumnya mungkin sudah masuk antrian (dan tidak bisa ditarik kembali),
+            # jadi respons error tetap menyebutkan event mana saja yang sudah diterima.
+            # Event yang masih menunggu di `pending` dibuang.
+            queued.sort()
+            return JSONResponse(
+                status_code=413 if isinstance(e, BodyTooLarge) else 400,
+                content={
+                    "detail": str(e),
+                    "accepted": len(queued),
+                    "queued": [{"index": i, "topic": events[i]["topic"], "event_id": events[i]["event_id"]} for i in queued],
+                    "invalid": invalid,
+                },
+            )
+        if pending:
+            await flush()
+        queued.sort()
+        return publish_response(len(events) + len(invalid), queued, events, invalid)
 
     @app.get("/events")
-    async def get_events(topic: Optional[str] = None):
-        """Mengambil semua event yang unik, bisa difilter berdasarkan topik."""
-        rows = app.state.store.list_events(topic)
-        return rows
+    async def get_events(
+        request: Request,
+        topic: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=10000),
+        after: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        format: Optional[str] = None,
+        fetch_all: bool = Query(False, alias="all"),
+    ):
+        """Mengambil event unik, bisa difilter berdasarkan topik dan rentang timestamp.
+
+        - `limit` + `after`: paginasi keyset; cursor halaman berikutnya ada di header `X-Next-Cursor`.
+          Tanpa `limit`, satu halaman berisi `events_page_size` event.
+        - `all=true` (tanpa `limit`/`after`): seluruh hasil sekaligus, dimuat penuh ke memori.
+        - `format=ndjson` (atau `Accept: application/x-ndjson`): hasil di-stream per baris.
+        - `payload.<field>=<nilai>`: filter kesamaan pada field payload (boleh bertingkat,
+          misalnya `payload.user.id=42`), dievaluasi di SQLite dengan `json_extract`.
+        """
+        store = app.state.store
+        payload_filters = {}
+        try:
+            parse_cursor(after, len(store.stores))
+            for key, value in request.query_params.multi_items():
+                if key.startswith("payload."):
+                    field = key[len("payload."):]
+                    payload_path(field)
+                    payload_filters[field] = filter_value(value)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+            return StreamingResponse(
+                _ndjson_lines(store.iter_events(topic, after, since, until, payload_filters=payload_filters), limit),
+                media_type="application/x-ndjson",
+            )
+
+        if fetch_all and limit is None and after is None:
+            return await read(store.list_events, topic, since, until, payload_filters)
+
+        page_size = limit or settings.events_page_size
+        rows, next_cursor = await read(store.list_events_page, topic, page_size, after, since, until, payload_filters)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return JSONResponse(rows, headers=headers)
+
+    @app.get("/subscribe")
+    async def subscribe(request: Request, topic: str, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1)):
+        """Server-Sent Events berisi event unik baru untuk satu topik, segera setelah di-commit consumer.
+
+        - Tanpa `after`: hanya event baru.
+        - `after=<cursor>` atau header `Last-Event-ID`: putar ulang event setelah cursor (dari buffer
+          memori jika masih tercakup, jika tidak dari database), lalu lanjut live. Setiap event membawa
+          `id:` berupa cursor untuk melanjutkan.
+        - `limit`: tutup stream setelah sejumlah event.
+        """
+        cursor = after if after is not None else request.headers.get("last-event-id")
+        try:
+            positions = parse_cursor(cursor, len(app.state.shards)) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(
+            subscription_stream(app, topic, positions, limit),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @app.get("/stats")
     async def get_stats():
         """Menampilkan statistik operasional sistem."""
         uptime = time.time() - app.state.start_time
+        counters = await read(app.state.counters.snapshot)
+        shards = app.state.shards
+        # Dibaca dari tabel ringkasan topic_stats (O(jumlah topik)), bukan scan tabel events.
+        topic_stats = await read(app.state.store.topic_stats)
         stats = {
-            "received": app.state.counters["received"],
-            "unique_processed": app.state.counters["unique_processed"],
-            "duplicate_dropped": app.state.counters["duplicate_dropped"],
-            "topics": app.state.store.list_topics(),
+            "received": counters["received"],
+            "unique_processed": counters["unique_processed"],
+            "duplicate_dropped": counters["duplicate_dropped"],
+            "write_failed": counters["write_failed"],
+            "topics": [t["topic"] for t in topic_stats],
+            "persisted": {
+                "unique_events": sum(t["unique_count"] for t in topic_stats),
+                "duplicates_dropped": sum(t["duplicate_count"] for t in topic_stats),
+            },
+            "queue": {
+                "events": sum(shard.queue.qsize() for shard in shards),
+                "bytes": sum(shard.queue.nbytes for shard in shards),
+            },
             "uptime_seconds": round(uptime, 2),
         }
+        if len(shards) > 1:
+            stats["shards"] = [{"index": shard.index, "queued_events": shard.queue.qsize()} for shard in shards]
+        prefilter = app.state.store.prefilter_stats()
+        if prefilter is not None:
+            stats["prefilter"] = prefilter
+        if settings.retention_days:
+            stats["partitions"] = await read(app.state.store.partition_stats)
+        stats["subscriptions"] = app.state.hub.stats()
+        spools = [shard.spool for shard in shards if shard.spool is not None]
+        if spools:
+            spool_stats = {name: sum(spool.stats[name] for spool in spools) for name in spools[0].stats}
+            spool_stats["pending_records"] = sum(spool.pending_records() for spool in spools)
+            stats["spool"] = spool_stats
         return stats
 
+    @app.get("/metrics")
+    async def get_metrics():
+        """Metrik dalam format teks Prometheus (histogram latensi per tahap, kedalaman antrian, ukuran batch)."""
+        if not metrics.enabled:
+            raise HTTPException(status_code=404, detail="Metrics are disabled")
+        counters = app.state.counters
+        app.state.counters_snapshot = await read(counters.snapshot) if counters.blocking else counters.snapshot()
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/stats/topics")
+    async def get_topic_stats():
+        """Statistik per topik yang persisten: jumlah unik, duplikat, first/last seen, dan event_id terakhir."""
+        return await read(app.state.store.topic_stats)
+
     return app
 
+def _ndjson_lines(rows, limit: Optional[int] = None, chunk_size: int = 500):
+    """Mengubah iterator baris menjadi potongan NDJSON.
+
+    Generator sinkron ini dijalankan Starlette di threadpool, jadi query SQLite
+    tidak memblokir event loop. Baris dikirim per potongan agar tidak ada
+    perpindahan thread untuk setiap baris.
+    """
+    lines = []
+    for count, row in enumerate(rows, 1):
+        lines.append(json.dumps(row) + "\n")
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+        if limit is not None and count >= limit:
+            break
+    if lines:
+        yield "".join(lines)
+
+
+# --- Langganan Live (SSE) ---
+async def subscription_stream(app: FastAPI, topic: str, positions: Optional[List[int]], limit: Optional[int], chunk_size: int = 500):
+    """Generator SSE untuk satu subscriber.
+
+    Event dikirim per shard dalam urutan rowid; event dengan rowid yang sudah terkirim dilewati,
+    sehingga peralihan dari replay database ke live tidak menggandakan event. Jika subscriber
+    tertinggal (buffer pending penuh), ia mengejar dari database alih-alih menahan consumer.
+    """
+    hub = app.state.hub
+    settings = app.state.settings
+    stores = app.state.store.stores
+    loop = asyncio.get_running_loop()
+    subscriber, pending, positions = hub.subscribe(topic, positions)
+    catch_up = pending is None
+    pending = pending or []
+    sent = 0
+    try:
+        while True:
+            if subscriber.overflowed:
+                subscriber.reset()
+                catch_up = True
+            if catch_up:
+                pending, catch_up = await loop.run_in_executor(
+                    app.state.readers, read_backlog, stores, topic, list(positions), chunk_size
+                )
+            elif not pending:
+                if not await subscriber.wait(settings.subscription_keepalive_seconds):
+                    yield ": keep-alive\n\n"
+                    continue
+                pending = subscriber.take()
+            for shard, rowid, event in pending:
+                if rowid <= positions[shard]:
+                    continue
+                positions[shard] = rowid
+                yield f"id: {format_cursor(positions)}\nevent: event\ndata: {json.dumps(event)}\n\n"
+                sent += 1
+                if limit is not None and sent >= limit:
+                    return
+            pending = []
+    finally:
+        hub.unsubscribe(subscriber)
+
+
 # --- Consumer Worker ---
-async def consumer_loop(app: FastAPI):
-    """Loop tak terbatas yang mengambil event dari antrian dan memprosesnya."""
+async def add_counters(app: FastAPI, executor: Optional[ThreadPoolExecutor], **deltas: int):
+    """Menambah counter /stats; SqliteCounters ditulis di `executor` agar event loop tidak menunggu disk."""
+    counters = app.state.counters
+    if counters.blocking:
+        await asyncio.get_running_loop().run_in_executor(executor, functools.partial(counters.add, **deltas))
+    else:
+        counters.add(**deltas)
+
+
+async def next_batch(queue: EventQueue, max_size: int, max_wait: float) -> List[Tuple[List[Dict[str, Any]], float]]:
+    """Menunggu satu item, lalu mengumpulkan item hingga max_size event atau max_wait detik.
+
+    Setiap item adalah pasangan (daftar event, waktu masuk antrian).
+    """
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get_timed()]
+    size = len(batch[0][0])
+    deadline = loop.time() + max_wait
+    while size < max_size:
+        try:
+            item = queue.get_nowait_timed()
+        except asyncio.QueueEmpty:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get_timed(), remaining)
+            except asyncio.TimeoutError:
+                break
+        batch.append(item)
+        size += len(item[0])
+    return batch
+
+
+async def replay_spool(app: FastAPI, shard: Shard) -> int:
+    """Membuka spool shard lalu memutar ulang isinya setelah checkpoint ke store.
+
+    Dipanggil sebelum consumer berjalan; akses file spool dilakukan di thread writer shard.
+    Setiap proses (uvicorn --workers N) mengambil slot spool sendiri; slot yang tidak
+    dipegang proses hidup (sisa worker yang sudah berhenti) ikut diputar ulang di sini.
+    Aman diulang: event yang sudah tersimpan akan terdeteksi sebagai duplikat.
+    """
+    loop = asyncio.get_running_loop()
+    settings = app.state.settings
+    base_dir = os.path.join(settings.spool_dir, f"shard{shard.index}")
+    options = dict(
+        segment_bytes=settings.spool_segment_bytes,
+        fsync=settings.spool_fsync,
+        fsync_interval_ms=settings.spool_fsync_interval_ms,
+    )
+    shard.spool = await loop.run_in_executor(shard.writer, functools.partial(claim_spool, base_dir, **options))
+    replayed = await _replay_into(app, shard, shard.spool)
+    await loop.run_in_executor(shard.writer, shard.spool.finish_replay)
+    orphans = orphaned_spools(base_dir, shard.spool, **options)
+    while (orphan := await loop.run_in_executor(shard.writer, next, orphans, None)) is not None:
+        try:
+            count = await _replay_into(app, shard, orphan)
+            await loop.run_in_executor(shard.writer, orphan.finish_replay)
+        finally:
+            await loop.run_in_executor(shard.writer, orphan.close)
+        shard.spool.stats["replayed_events"] += count
+        replayed += count
+    return replayed
+
+
+async def _replay_into(app: FastAPI, shard: Shard, spool: Spool) -> int:
+    loop = asyncio.get_running_loop()
+    batch_size = max(1, app.state.settings.batch_size)
+    replayed = 0
+    pending: List[Dict[str, Any]] = []
+    records = spool.replay()
+    while (events := await loop.run_in_executor(shard.writer, next, records, None)) is not None:
+        pending.extend(events)
+        replayed += len(events)
+        if len(pending) >= batch_size:
+            await count_written(app, shard, *await write_batch(shard, pending))
+            pending = []
+    if pending:
+        await count_written(app, shard, *await write_batch(shard, pending))
+    return replayed
+
+
+async def spool_flush_loop(app: FastAPI):
+    """Untuk spool_fsync=interval: fsync berkala agar tulisan terakhir tidak menunggu append berikutnya."""
+    loop = asyncio.get_running_loop()
+    interval = app.state.settings.spool_fsync_interval_ms / 1000
+    while True:
+        await asyncio.sleep(interval)
+        for shard in app.state.shards:
+            await loop.run_in_executor(shard.spool_writer, shard.spool.flush)
+
+
+async def compact_shard(app: FastAPI, shard: Shard):
+    """Satu putaran kompaksi: merge file data (Bitcask), drop partisi kedaluwarsa,
+    bangun ulang Bloom filter, lalu vacuum bertahap.
+
+    Merge menyalin data di luar lock store, jadi dijalankan di executor default;
+    langkah lainnya di thread writer shard, sehingga bergantian dengan batch consumer.
+    """
+    loop = asyncio.get_running_loop()
+    store = shard.store
+    merged = await loop.run_in_executor(None, store.merge)
+    if merged:
+        logger.info(f"🧹 Shard {shard.index}: {merged} file data digabung")
+    dropped = await loop.run_in_executor(shard.writer, store.drop_expired_partitions)
+    if not dropped:
+        return
+    logger.info(f"🧹 Shard {shard.index}: partisi kedaluwarsa dihapus: {', '.join(dropped)}")
+    steps = store.rebuild_prefilter()
+    while await loop.run_in_executor(shard.writer, next, steps, None) is not None:
+        await asyncio.sleep(0)
+    pages = app.state.settings.vacuum_step_pages
+    while await loop.run_in_executor(shard.writer, store.incremental_vacuum, pages) > 0:
+        await asyncio.sleep(0)
+
+
+async def compaction_loop(app: FastAPI):
+    """Task latar belakang untuk retensi dan merge; error satu putaran tidak menghentikan loop."""
+    while True:
+        for shard in app.state.shards:
+            try:
+                await compact_shard(app, shard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Kompaksi shard {shard.index} gagal: {e}")
+        await asyncio.sleep(app.state.settings.compaction_interval_seconds)
+
+
+def is_transient_write_error(error: Exception) -> bool:
+    """Error yang bisa hilang sendiri jika ditunggu: disk/IO, atau SQLite sibuk/terkunci."""
+    return isinstance(error, (OSError, sqlite3.OperationalError))
+
+
+async def write_batch(shard: Shard, batch: List[Dict[str, Any]]) -> Tuple[List[Optional[int]], List[int]]:
+    """Menulis satu batch dalam satu transaksi di thread writer.
+
+    Mengembalikan rowid per event (None untuk duplikat) dan indeks event yang tidak
+    bisa ditulis. Error transien (lihat is_transient_write_error) dicoba ulang dengan
+    backoff tanpa batas: selama itu antrian shard terisi sehingga /publish menolak
+    dengan 429/503, dan checkpoint spool tidak bergerak. Error lain berarti ada event
+    yang tidak akan pernah bisa ditulis; batch dibelah dua sampai event itu ketemu,
+    lalu event tersebut dicatat di log dan dibuang agar shard tetap berjalan.
+    Mengulang aman karena event yang sudah tersimpan terdeteksi sebagai duplikat.
+    """
+    loop = asyncio.get_running_loop()
+    delay = WRITE_RETRY_INITIAL_SECONDS
     while True:
         try:
-            event_data = await app.state.queue.get()
-            
-            is_new = app.state.store.record_event(
-                event_data["topic"],
-                event_data["event_id"],
-                event_data["timestamp"],
-                event_data.get("source", ""),
-                event_data.get("payload", {})
-            )
-            
-            if not is_new:
-                app.state.counters["duplicate_dropped"] += 1
-                logger.info(f"💡 Duplicate dropped: {event_data['topic']}|{event_data['event_id']}")
-            else:
-                app.state.counters["unique_processed"] += 1
-                logger.info(f"✅ Processed unique event: {event_data['topic']}|{event_data['event_id']}")
-            
-            app.state.queue.task_done()
+            return await loop.run_in_executor(shard.writer, shard.store.record_events_rowids, batch), []
+        except Exception as e:
+            if not is_transient_write_error(e):
+                error = e
+                break
+            logger.error(f"Shard {shard.index}: gagal menulis batch {len(batch)} event, dicoba lagi dalam {delay:.1f} detik: {e}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WRITE_RETRY_MAX_SECONDS)
+    if len(batch) == 1:
+        # Topic/event_id dipotong: event yang gagal bisa saja karena kuncinya terlalu panjang.
+        key = f"{batch[0]['topic'][:100]}|{batch[0]['event_id'][:100]}"
+        logger.error(f"Shard {shard.index}: event {key} dibuang, tidak bisa ditulis: {error!r}")
+        return [None], [0]
+    mid = len(batch) // 2
+    left, left_failed = await write_batch(shard, batch[:mid])
+    right, right_failed = await write_batch(shard, batch[mid:])
+    return left + right, left_failed + [mid + i for i in right_failed]
+
+
+async def count_written(app: FastAPI, shard: Shard, rowids: List[Optional[int]], failed: List[int]):
+    unique = sum(rowid is not None for rowid in rowids)
+    await add_counters(
+        app, shard.writer,
+        unique_processed=unique, duplicate_dropped=len(rowids) - unique - len(failed), write_failed=len(failed),
+    )
+
+
+async def consumer_loop(app: FastAPI, shard: Shard):
+    """Loop tak terbatas yang mengambil batch event dari antrian shard dan memprosesnya."""
+    settings = app.state.settings
+    metrics = app.state.metrics
+    event_log = app.state.event_log
+    loop = asyncio.get_running_loop()
+    while True:
+        items = await next_batch(shard.queue, max(1, settings.batch_size), settings.batch_wait_ms / 1000)
+        batch = [event_data for events, _ in items for event_data in events]
+        try:
+            if metrics.enabled:
+                dequeued = time.perf_counter()
+                for events, enqueued_at in items:
+                    metrics.observe_stage("queue_wait", dequeued - enqueued_at, len(events))
+                metrics.observe_batch(shard.index, len(batch))
+
+            rowids, failed = await write_batch(shard, batch)
+            # Event unik yang sudah di-commit langsung diteruskan ke subscriber /subscribe.
+            app.state.hub.publish(shard.index, batch, rowids)
+
+            if metrics.enabled:
+                durable = time.perf_counter()
+                metrics.observe_stage("db_write", durable - dequeued)
+                for events, enqueued_at in items:
+                    metrics.observe_stage("ingest_to_durable", durable - enqueued_at, len(events))
+
+            if event_log.per_second > 0:
+                skipped = set(failed)
+                for i, (event_data, rowid) in enumerate(zip(batch, rowids)):
+                    if i in skipped:
+                        continue
+                    if rowid is None:
+                        event_log.info("💡 Duplicate dropped: %s|%s", event_data["topic"], event_data["event_id"])
+                    else:
+                        event_log.info("✅ Processed unique event: %s|%s", event_data["topic"], event_data["event_id"])
+            await count_written(app, shard, rowids, failed)
         except Exception as e:
-            logger.exception(f"Error processing event: {e}")
+            logger.exception(f"Error processing batch of {len(batch)} event(s): {e}")
+        finally:
+            for _ in items:
+                shard.queue.task_done()
+        if shard.spool is not None:
+            # Sampai di sini batch sudah di-commit, kecuali event yang dibuang karena memang
+            # tidak bisa ditulis, jadi chunk-nya tidak perlu diputar ulang.
+            await loop.run_in_executor(shard.spool_writer, shard.spool.ack, len(items))
 
 # --- Inisialisasi utama untuk Uvicorn ---
-app = create_app()
+app = create_app(settings=Settings.from_env())
 
 if __name__ == "__main__":
     uvicorn.run("src.main:app", host="0.0.0.0", port=8080, reload=True)
\ No newline at end of file
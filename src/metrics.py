@@ -0,0 +1,148 @@
+import bisect
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed buckets.
+
+    Not thread-safe: observations are made from the event loop thread.
+    """
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str, n: int = 1):
+        """Record ``n`` observations of ``value`` (e.g. every event of a batch that waited equally long)."""
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += n
+        series[1] += value * n
+        series[2] += n
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        collect: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+        labelnames: Sequence[str] = (),
+    ):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labelvalues, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Metrics:
+    """Registry for the hot-path instrumentation.
+
+    When disabled every ``observe_*`` call returns immediately and callers
+    skip reading the clock (check ``enabled`` first), so the cost is one
+    attribute lookup per call site.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            "aggregator_stage_seconds", "Latency of each ingest stage in seconds.", LATENCY_BUCKETS, ("stage",)
+        )
+        self.batch_size = Histogram(
+            "aggregator_consumer_batch_size", "Number of events written per consumer transaction.", SIZE_BUCKETS, ("shard",)
+        )
+        self._callbacks: List[CallbackMetric] = []
+
+    def observe_stage(self, stage: str, seconds: float, n: int = 1):
+        if self.enabled:
+            self.stage_seconds.observe(seconds, stage, n=n)
+
+    def observe_batch(self, shard: int, size: int):
+        if self.enabled:
+            self.batch_size.observe(size, str(shard))
+
+    def register_callback(self, metric: CallbackMetric):
+        self._callbacks.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.stage_seconds, self.batch_size, *self._callbacks):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RateLimitedLogger:
+    """Emit at most ``per_second`` log lines per second and report the rest as a count.
+
+    ``per_second <= 0`` disables the messages entirely.
+    """
+
+    def __init__(self, logger: logging.Logger, per_second: float, clock: Callable[[], float] = time.monotonic):
+        self.logger = logger
+        self.per_second = per_second
+        self._clock = clock
+        self._window_start = 0.0
+        self._emitted = 0
+        self._suppressed = 0
+
+    def info(self, msg: str, *args):
+        if self.per_second <= 0:
+            return
+        now = self._clock()
+        if now - self._window_start >= 1.0:
+            if self._suppressed:
+                self.logger.info("... %d similar log line(s) suppressed", self._suppressed)
+            self._window_start = now
+            self._emitted = 0
+            self._suppressed = 0
+        if self._emitted < self.per_second:
+            self._emitted += 1
+            self.logger.info(msg, *args)
+        else:
+            self._suppressed += 1
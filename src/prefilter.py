@@ -0,0 +1,188 @@
+import hashlib
+import math
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+Key = Tuple[str, str]
+
+
+def _key_bytes(key: Key) -> bytes:
+    return key[0].encode("utf-8") + b"\x00" + key[1].encode("utf-8")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a bytearray.
+
+    Sized for ``capacity`` keys at ``error_rate`` false positives; memory is
+    ``ceil(-capacity * ln(error_rate) / ln(2)**2 / 8)`` bytes and never grows.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: Key):
+        # Kirsch-Mitzenmacher double hashing from a single 128-bit digest.
+        digest = hashlib.blake2b(_key_bytes(key), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: Key) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: Key) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+
+class RecentKeys:
+    """Exact LRU set of the most recently seen keys, each with an optional tag.
+
+    The store tags keys with the retention partition that holds them, so an
+    entry can be recognised as expired.
+    """
+
+    def __init__(self, maxsize: int):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self._keys: "OrderedDict[Key, Any]" = OrderedDict()
+
+    def add(self, key: Key, tag: Any = None) -> None:
+        self._keys[key] = tag
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+
+    def clear(self) -> None:
+        self._keys.clear()
+
+    def discard(self, key: Key) -> None:
+        self._keys.pop(key, None)
+
+    def tag(self, key: Key) -> Any:
+        return self._keys.get(key)
+
+    def touch(self, key: Key) -> bool:
+        """Return True (and refresh recency) if the key is present."""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class DedupPrefilter:
+    """In-process filter in front of the SQLite dedup table.
+
+    ``classify`` answers one of:
+
+    * ``"duplicate"``: the key is in the recent-key LRU, so it is stored already
+      (and, when the caller passes ``expired``, its tag is not expired).
+    * ``"absent"``: the Bloom filter has never seen the key, so the existence
+      probe can be skipped and the row inserted directly.
+    * ``"maybe"``: the Bloom filter has (probably) seen it; the store probes.
+    * ``"unknown"``: no Bloom filter configured; the store just inserts.
+
+    Keys must only be added once they are committed, so a rolled back
+    transaction never makes the filter claim a key that is not stored.
+    """
+
+    def __init__(self, lru_size: int = 0, bloom_capacity: int = 0, bloom_error_rate: float = 0.01):
+        self.recent = RecentKeys(lru_size) if lru_size > 0 else None
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate) if bloom_capacity > 0 else None
+        # Replacement Bloom filter being filled while keys expire (see begin_rebuild).
+        self._next_bloom: Optional[BloomFilter] = None
+        self.counters: Dict[str, int] = {
+            "lru_hits": 0,
+            "lru_misses": 0,
+            "bloom_negatives": 0,
+            "bloom_positives": 0,
+            "bloom_false_positives": 0,
+        }
+
+    def classify(self, key: Key, expired: Optional[Callable[[Any], bool]] = None) -> str:
+        if self.recent is not None:
+            if self.recent.touch(key):
+                if expired is None or not expired(self.recent.tag(key)):
+                    self.counters["lru_hits"] += 1
+                    return "duplicate"
+                # Its copy in the store is outside the retention window.
+                self.recent.discard(key)
+            self.counters["lru_misses"] += 1
+        if self.bloom is not None:
+            if key not in self.bloom:
+                self.counters["bloom_negatives"] += 1
+                return "absent"
+            self.counters["bloom_positives"] += 1
+            return "maybe"
+        return "unknown"
+
+    def record_false_positive(self) -> None:
+        self.counters["bloom_false_positives"] += 1
+
+    def add(self, key: Key, tag: Any = None) -> None:
+        """Register a key that was just committed as new."""
+        if self.recent is not None:
+            self.recent.add(key, tag)
+        if self.bloom is not None:
+            self.bloom.add(key)
+        if self._next_bloom is not None:
+            self._next_bloom.add(key)
+
+    def forget_recent(self) -> None:
+        """Drop the LRU after keys expired from the store; it may name expired keys."""
+        if self.recent is not None:
+            self.recent.clear()
+
+    def begin_rebuild(self) -> bool:
+        """Start filling a fresh Bloom filter so expired keys stop costing probes.
+
+        From here on ``add`` writes to both filters; the caller then feeds
+        every key still stored through ``rebuild_add`` and calls
+        ``finish_rebuild``. Starting before the scan means no key committed
+        meanwhile can be missed, so the new filter never has false negatives.
+        """
+        if self.bloom is None:
+            return False
+        self._next_bloom = BloomFilter(self.bloom.capacity, self.bloom.error_rate)
+        return True
+
+    def rebuild_add(self, keys: Iterable[Key]) -> None:
+        if self._next_bloom is not None:
+            for key in keys:
+                self._next_bloom.add(key)
+
+    def finish_rebuild(self) -> None:
+        if self._next_bloom is not None:
+            self.bloom, self._next_bloom = self._next_bloom, None
+
+    def seen(self, key: Key, tag: Any = None) -> None:
+        """Register a key confirmed to be a duplicate, so hot retries hit the LRU."""
+        if self.recent is not None:
+            self.recent.add(key, tag)
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self.counters)
+        stats["lru_size"] = len(self.recent) if self.recent is not None else 0
+        stats["bloom_keys"] = self.bloom.count if self.bloom is not None else 0
+        stats["bloom_bytes"] = self.bloom.size_bytes if self.bloom is not None else 0
+        return stats
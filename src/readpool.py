@@ -0,0 +1,40 @@
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator, List
+from urllib.parse import quote
+
+
+class ReadPool:
+    """Fixed set of read-only SQLite connections, one borrowed per query.
+
+    Only useful in WAL mode, where readers see the last committed snapshot
+    without blocking the writer connection (and without being blocked by it).
+    """
+
+    def __init__(self, db_path: str, size: int):
+        uri = "file:" + quote(os.path.abspath(db_path)) + "?mode=ro"
+        self._conns: List[sqlite3.Connection] = [
+            sqlite3.connect(uri, uri=True, check_same_thread=False) for _ in range(size)
+        ]
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for conn in self._conns:
+            self._idle.put(conn)
+
+    @property
+    def size(self) -> int:
+        return len(self._conns)
+
+    @contextmanager
+    def cursor(self) -> Iterator[sqlite3.Cursor]:
+        conn = self._idle.get()
+        try:
+            yield conn.cursor()
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for conn in self._conns:
+            conn.close()
+        self._conns = []
@@ -0,0 +1,63 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+
+def _position(key: str) -> int:
+    # md5 only for its spread; the first 8 bytes give a 64-bit ring position.
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping topics onto nodes.
+
+    Each node owns ``vnodes`` points on the ring and a topic belongs to the
+    first point clockwise from its hash. Adding or removing a node only moves
+    the topics on the arcs that node gains or loses (about 1/N of them); every
+    other topic keeps its owner.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 160):
+        if vnodes < 1:
+            raise ValueError("vnodes must be at least 1")
+        self.vnodes = vnodes
+        self._nodes: List[str] = []
+        self._points: List[Tuple[int, str]] = []
+        self._keys: List[int] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def add(self, node: str):
+        if node in self._nodes:
+            raise ValueError(f"Node already in ring: {node}")
+        self._nodes.append(node)
+        self._points.extend((_position(f"{node}#{i}"), node) for i in range(self.vnodes))
+        self._rebuild()
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            raise ValueError(f"Node not in ring: {node}")
+        self._nodes.remove(node)
+        self._points = [point for point in self._points if point[1] != node]
+        self._rebuild()
+
+    def _rebuild(self):
+        self._points.sort()
+        self._keys = [position for position, _ in self._points]
+
+    def node_for(self, topic: str) -> str:
+        if not self._points:
+            raise LookupError("Ring has no nodes")
+        i = bisect.bisect_right(self._keys, _position(topic)) % len(self._keys)
+        return self._points[i][1]
+
+    def assign(self, topics: Iterable[str]) -> Dict[str, List[str]]:
+        """Group topics by owner node."""
+        owners: Dict[str, List[str]] = {}
+        for topic in topics:
+            owners.setdefault(self.node_for(topic), []).append(topic)
+        return owners
@@ -0,0 +1,330 @@
+"""Router untuk mode cluster: beberapa node aggregator di belakang satu entry point.
+
+Setiap topik dimiliki satu node menurut consistent hashing (lihat `src/ring.py`).
+`/publish` dipecah per node pemilik dan diteruskan paralel lewat koneksi
+*keep-alive* bersama; `/events` dan `/stats` disebar ke semua node lalu digabung.
+
+Jalankan dengan:
+    AGGREGATOR_ROUTER_NODES=http://node1:8080,http://node2:8080 \\
+        uvicorn src.router:create_router_app --factory --port 8000
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .config import Settings
+from .ingest import BodyDecoder, BodyTooLarge, InvalidBody, validate_batch
+from .ring import HashRing
+
+logger = logging.getLogger("aggregator.router")
+
+
+def parse_router_cursor(cursor: Optional[str], nodes: List[str]) -> Dict[str, Optional[str]]:
+    """Cursor router: JSON {node: cursor node, atau null jika node sudah habis}, di-base64url.
+
+    Node yang belum ada di cursor (misalnya node baru) dibaca dari awal.
+    """
+    if not cursor:
+        return {node: "" for node in nodes}
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(decoded, dict) or not all(v is None or isinstance(v, str) for v in decoded.values()):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return {node: decoded.get(node, "") for node in nodes}
+
+
+def format_router_cursor(positions: Dict[str, Optional[str]]) -> str:
+    raw = json.dumps(positions, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def split_limit(limit: int, nodes: List[str]) -> Dict[str, int]:
+    """Bagi `limit` serata mungkin ke node; node yang kebagian 0 dilewati di halaman ini."""
+    share, extra = divmod(limit, len(nodes))
+    return {node: share + (i < extra) for i, node in enumerate(nodes) if share + (i < extra) > 0}
+
+
+def merge_topic_stats(per_node: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Gabungkan topic_stats semua node; topik yang pernah pindah node dijumlahkan."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for rows in per_node:
+        for row in rows:
+            current = merged.get(row["topic"])
+            if current is None:
+                merged[row["topic"]] = dict(row)
+                continue
+            current["unique_count"] += row["unique_count"]
+            current["duplicate_count"] += row["duplicate_count"]
+            if row["first_seen"] and (not current["first_seen"] or row["first_seen"] < current["first_seen"]):
+                current["first_seen"] = row["first_seen"]
+            if row["last_seen"] and (not current["last_seen"] or row["last_seen"] > current["last_seen"]):
+                current["last_seen"] = row["last_seen"]
+                current["last_event_id"] = row["last_event_id"] or current["last_event_id"]
+    return [merged[topic] for topic in sorted(merged)]
+
+
+def create_router_app(settings: Optional[Settings] = None, nodes: Optional[List[str]] = None):
+    settings = settings or Settings.from_env()
+    if nodes is None:
+        nodes = [node.strip().rstrip("/") for node in (settings.router_nodes or "").split(",") if node.strip()]
+    if not nodes:
+        raise ValueError("Router needs at least one node (AGGREGATOR_ROUTER_NODES)")
+    ring = HashRing(nodes, settings.router_vnodes)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Satu client untuk semua node: koneksi keep-alive dipakai ulang antar request.
+        limits = httpx.Limits(
+            max_connections=settings.router_max_connections,
+            max_keepalive_connections=settings.router_max_connections,
+        )
+        app.state.client = httpx.AsyncClient(limits=limits, timeout=settings.router_timeout_seconds)
+        logger.info(f"🔀 Router aktif untuk {len(ring.nodes)} node: {', '.join(ring.nodes)}")
+        yield
+        await app.state.client.aclose()
+
+    app = FastAPI(title="UTS Log Aggregator Router", lifespan=lifespan)
+    app.state.settings = settings
+    app.state.ring = ring
+    app.state.start_time = time.time()
+
+    async def fan_out(path: str, params=None) -> List[Tuple[str, Any]]:
+        """GET `path` di semua node secara paralel; hasilnya (node, JSON) atau (node, exception)."""
+        client: httpx.AsyncClient = app.state.client
+
+        async def get(node: str):
+            response = await client.get(node + path, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        results = await asyncio.gather(*(get(node) for node in ring.nodes), return_exceptions=True)
+        return list(zip(ring.nodes, results))
+
+    def require_all(results: List[Tuple[str, Any]]):
+        failed = [node for node, result in results if isinstance(result, Exception)]
+        if failed:
+            raise HTTPException(status_code=502, detail=f"Node(s) unavailable: {', '.join(failed)}")
+
+    @app.post("/publish", status_code=202)
+    async def publish(
+        request: Request, on_full: Optional[str] = None, wait_ms: Optional[float] = Query(None, ge=0)
+    ):
+        """Memecah batch per node pemilik topik dan meneruskannya secara paralel.
+
+        Respons mengikuti format `/publish` node: 202 jika semua event diterima,
+        429/503 beserta daftar `queued` (indeks asli) jika sebagian/semua ditolak.
+        Event untuk node yang tidak bisa dihubungi ikut dihitung sebagai ditolak.
+        Error klien dari node (4xx selain 429) diteruskan apa adanya, tanpa
+        `Retry-After`, karena mengulang request yang sama tidak akan berhasil.
+        """
+        if on_full is not None and on_full not in ("wait", "reject"):
+            raise HTTPException(status_code=400, detail="on_full must be 'wait' or 'reject'")
+        try:
+            decoder = BodyDecoder(request.headers.get("content-encoding"), settings.max_body_bytes)
+            chunks = [decoder.decode(chunk) async for chunk in request.stream()]
+            chunks.append(decoder.flush())
+            valid, invalid = validate_batch(b"".join(chunks))
+        except BodyTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except InvalidBody as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        total = len(valid) + len(invalid)
+        if invalid and not valid:
+            return JSONResponse(status_code=422, content={"detail": "Schema validation error", "invalid": invalid})
+
+        groups: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for index, event in valid:
+            groups.setdefault(ring.node_for(event["topic"]), []).append((index, event))
+        params = {k: v for k, v in (("on_full", on_full), ("wait_ms", wait_ms)) if v is not None}
+        client: httpx.AsyncClient = app.state.client
+        client_errors: List[Tuple[str, httpx.Response]] = []
+
+        async def forward(node: str, group: List[Tuple[int, Dict[str, Any]]]) -> List[int]:
+            """Kirim satu kelompok; kembalikan indeks asli event yang masuk antrian node."""
+            body = json.dumps([event for _, event in group], separators=(",", ":")).encode("utf-8")
+            try:
+                response = await client.post(
+                    node + "/publish", content=body, params=params, headers={"Content-Type": "application/json"}
+                )
+            except httpx.HTTPError as e:
+                logger.error(f"Gagal meneruskan {len(group)} event ke {node}: {e}")
+                return []
+            if response.status_code == 202:
+                return [index for index, _ in group]
+            if response.status_code in (429, 503):
+                return [group[item["index"]][0] for item in response.json().get("queued", [])]
+            logger.error(f"Node {node} menolak batch: HTTP {response.status_code}")
+            if 400 <= response.status_code < 500:
+                client_errors.append((node, response))
+            return []
+
+        results = await asyncio.gather(*(forward(node, group) for node, group in groups.items()))
+        queued = sorted(index for indexes in results for index in indexes)
+        events = dict(valid)
+        if client_errors:
+            node, response = client_errors[0]
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            detail = body.get("detail", body) if isinstance(body, dict) else body
+            return JSONResponse(
+                status_code=response.status_code,
+                content={
+                    "detail": detail,
+                    "node": node,
+                    "accepted": len(queued),
+                    "queued": [{"index": i, "topic": events[i]["topic"], "event_id": events[i]["event_id"]} for i in queued],
+                    "invalid": invalid,
+                },
+            )
+        if len(queued) == len(valid):
+            content = {"message": f"{len(queued)} event(s) were accepted into the queue.", "accepted": len(queued)}
+            if invalid:
+                content["invalid"] = invalid
+            return JSONResponse(status_code=202, content=content)
+        return JSONResponse(
+            status_code=429 if queued else 503,
+            headers={"Retry-After": str(settings.retry_after_seconds)},
+            content={
+                "message": f"Not all nodes accepted the batch: {len(queued)} of {total} event(s) were accepted.",
+                "accepted": len(queued),
+                "rejected": total - len(queued),
+                "queued": [{"index": i, "topic": events[i]["topic"], "event_id": events[i]["event_id"]} for i in queued],
+                "invalid": invalid,
+            },
+        )
+
+    @app.get("/events")
+    async def get_events(
+        request: Request,
+        limit: Optional[int] = Query(None, ge=1, le=10000),
+        after: Optional[str] = None,
+        format: Optional[str] = None,
+        fetch_all: bool = Query(False, alias="all"),
+    ):
+        """Scatter-gather `/events` ke semua node (filter `topic`, `since`, `until`, `payload.*` diteruskan).
+
+        Semua node ditanya, bukan hanya pemilik topik, karena riwayat topik yang
+        pindah node saat keanggotaan berubah tetap tersimpan di node lamanya.
+
+        - `limit` + `after`: `limit` (default `events_page_size`) dibagi ke node yang belum
+          habis dan diminta paralel; cursor berikutnya (berisi cursor per node) ada di header
+          `X-Next-Cursor`.
+        - `all=true` (tanpa `limit`/`after`): gabungan seluruh hasil node.
+        - `format=ndjson`: hasil tiap node di-stream bergiliran.
+        """
+        filters = [(k, v) for k, v in request.query_params.multi_items() if k not in ("limit", "after", "format", "all")]
+        client: httpx.AsyncClient = app.state.client
+
+        if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+            if after is not None:
+                raise HTTPException(status_code=400, detail="after is not supported with format=ndjson on the router")
+
+            async def lines():
+                sent = 0
+                for node in ring.nodes:
+                    async with client.stream("GET", node + "/events", params=filters + [("format", "ndjson")]) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            yield line + "\n"
+                            sent += 1
+                            if limit is not None and sent >= limit:
+                                return
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        if fetch_all and limit is None and after is None:
+            results = await fan_out("/events", filters + [("all", "true")])
+            require_all(results)
+            return [row for _, rows in results for row in rows]
+
+        try:
+            positions = parse_router_cursor(after, ring.nodes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        active = [node for node in ring.nodes if positions[node] is not None]
+        shares = split_limit(limit or settings.events_page_size, active) if active else {}
+
+        async def page(node: str, share: int):
+            params = filters + [("limit", str(share))] + ([("after", positions[node])] if positions[node] else [])
+            response = await client.get(node + "/events", params=params)
+            response.raise_for_status()
+            return response.json(), response.headers.get("x-next-cursor")
+
+        nodes = list(shares)
+        results = await asyncio.gather(*(page(node, shares[node]) for node in nodes), return_exceptions=True)
+        require_all(list(zip(nodes, results)))
+        rows: List[Dict[str, Any]] = []
+        for node, (node_rows, next_cursor) in zip(nodes, results):
+            rows.extend(node_rows)
+            # Node tanpa cursor berikutnya sudah habis dibaca.
+            positions[node] = next_cursor
+        done = all(positions[node] is None for node in ring.nodes)
+        headers = {} if done else {"X-Next-Cursor": format_router_cursor(positions)}
+        return JSONResponse(rows, headers=headers)
+
+    @app.get("/stats")
+    async def get_stats():
+        """Statistik gabungan semua node, plus ringkasan per node (node yang gagal ditandai `ok: false`)."""
+        results = await fan_out("/stats")
+        healthy = [stats for _, stats in results if not isinstance(stats, Exception)]
+        topics = sorted({topic for stats in healthy for topic in stats["topics"]})
+        nodes = []
+        for node, stats in results:
+            if isinstance(stats, Exception):
+                nodes.append({"node": node, "ok": False, "error": str(stats) or type(stats).__name__})
+            else:
+                nodes.append({
+                    "node": node,
+                    "ok": True,
+                    "received": stats["received"],
+                    "unique_processed": stats["unique_processed"],
+                    "duplicate_dropped": stats["duplicate_dropped"],
+                    "write_failed": stats["write_failed"],
+                    "topics": len(stats["topics"]),
+                    "queued_events": stats["queue"]["events"],
+                })
+        return {
+            "received": sum(stats["received"] for stats in healthy),
+            "unique_processed": sum(stats["unique_processed"] for stats in healthy),
+            "duplicate_dropped": sum(stats["duplicate_dropped"] for stats in healthy),
+            "write_failed": sum(stats["write_failed"] for stats in healthy),
+            "topics": topics,
+            "persisted": {
+                name: sum(stats["persisted"][name] for stats in healthy)
+                for name in ("unique_events", "duplicates_dropped")
+            },
+            "queue": {name: sum(stats["queue"][name] for stats in healthy) for name in ("events", "bytes")},
+            "uptime_seconds": round(time.time() - app.state.start_time, 2),
+            "nodes": nodes,
+        }
+
+    @app.get("/stats/topics")
+    async def get_topic_stats():
+        """Statistik per topik dari semua node, digabung per topik."""
+        results = await fan_out("/stats/topics")
+        require_all(results)
+        return merge_topic_stats([rows for _, rows in results])
+
+    @app.get("/cluster")
+    async def get_cluster(topic: Optional[str] = None):
+        """Daftar node di ring; dengan `topic`, juga node pemiliknya."""
+        content: Dict[str, Any] = {"nodes": ring.nodes, "vnodes": ring.vnodes}
+        if topic is not None:
+            content["owner"] = ring.node_for(topic)
+        return content
+
+    return app
@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .backend import EventStore
+from .ingest_queue import EventQueue
+from .spool import Spool
+
+
+def shard_for(topic: str, event_id: str, num_shards: int) -> int:
+    """Stable shard index for a key.
+
+    Uses crc32 rather than ``hash()``, which is salted per process; every
+    uvicorn worker must route the same key to the same shard file.
+    """
+    if num_shards <= 1:
+        return 0
+    return zlib.crc32(topic.encode("utf-8") + b"\x00" + event_id.encode("utf-8")) % num_shards
+
+
+def shard_paths(db_path: str, num_shards: int) -> List[str]:
+    """``dedup.db`` stays as is for one shard, else ``dedup.shard0.db`` ..."""
+    if num_shards <= 1:
+        return [db_path]
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{i}{ext or '.db'}" for i in range(num_shards)]
+
+
+def parse_cursor(cursor: Optional[str], num_shards: int) -> List[int]:
+    """Decode an ``after`` cursor: one rowid per shard, comma separated.
+
+    With a single shard the cursor is simply the last seen rowid.
+    """
+    if not cursor:
+        return [0] * num_shards
+    try:
+        positions = [int(part) for part in cursor.split(",")]
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if len(positions) != num_shards or any(p < 0 for p in positions):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return positions
+
+
+def format_cursor(positions: List[int]) -> str:
+    return ",".join(str(p) for p in positions)
+
+
+@dataclass
+class Shard:
+    """One partition of the key space: its own store, queue, writer and consumer."""
+
+    index: int
+    store: EventStore
+    queue: EventQueue
+    writer: Optional[ThreadPoolExecutor] = None
+    task: Optional[asyncio.Task] = None
+    spool: Optional[Spool] = None
+    spool_writer: Optional[ThreadPoolExecutor] = None
+
+
+class ShardedStore:
+    """Read/write facade over the per-shard stores that merges their results."""
+
+    def __init__(self, stores: List[EventStore]):
+        self.stores = stores
+
+    def store_for(self, topic: str, event_id: str) -> EventStore:
+        return self.stores[shard_for(topic, event_id, len(self.stores))]
+
+    def init_db(self):
+        for store in self.stores:
+            store.init_db()
+
+    def record_event(self, topic: str, event_id: str, timestamp: str, source: str, payload: Dict[str, Any]) -> bool:
+        return self.store_for(topic, event_id).record_event(topic, event_id, timestamp, source, payload)
+
+    def record_events(self, events: List[Dict[str, Any]]) -> List[bool]:
+        by_shard: Dict[int, List[int]] = {}
+        for i, ev in enumerate(events):
+            by_shard.setdefault(shard_for(ev["topic"], ev["event_id"], len(self.stores)), []).append(i)
+        results: List[bool] = [False] * len(events)
+        for shard, indexes in by_shard.items():
+            flags = self.stores[shard].record_events([events[i] for i in indexes])
+            for i, flag in zip(indexes, flags):
+                results[i] = flag
+        return results
+
+    def list_events(
+        self,
+        topic: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        for store in self.stores:
+            rows.extend(store.list_events(topic, since=since, until=until, payload_filters=payload_filters))
+        return rows
+
+    def list_events_page(
+        self,
+        topic: Optional[str] = None,
+        limit: int = 100,
+        after: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page merged across shards, plus the cursor for the next page.
+
+        Each shard is read past its own position in the cursor; the merged
+        page keeps each shard's rowid order, so advancing only the positions
+        of the rows actually returned never skips or repeats an event. The
+        next cursor is None once every shard is exhausted.
+        """
+        positions = parse_cursor(after, len(self.stores))
+        pages = [
+            [(rowid, shard, row) for rowid, row in store.list_events_page(topic, limit, positions[shard], since, until, payload_filters)]
+            for shard, store in enumerate(self.stores)
+        ]
+        merged = list(heapq.merge(*pages, key=lambda item: (item[0], item[1])))
+        taken = merged[:limit]
+        for rowid, shard, _ in taken:
+            positions[shard] = rowid
+        exhausted = len(merged) <= limit and all(len(page) < limit for page in pages)
+        return [row for _, _, row in taken], None if exhausted else format_cursor(positions)
+
+    def iter_events(
+        self,
+        topic: Optional[str] = None,
+        after: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        chunk_size: int = 1000,
+        payload_filters: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        positions = parse_cursor(after, len(self.stores))
+        for shard, store in enumerate(self.stores):
+            for _, row in store.iter_events(topic, positions[shard], since, until, chunk_size, payload_filters):
+                yield row
+
+    def list_topics(self) -> List[str]:
+        topics: Dict[str, None] = {}
+        for store in self.stores:
+            topics.update(dict.fromkeys(store.list_topics()))
+        return list(topics)
+
+    def topic_stats(self) -> List[Dict[str, Any]]:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for store in self.stores:
+            for row in store.topic_stats():
+                current = merged.get(row["topic"])
+                if current is None:
+                    merged[row["topic"]] = dict(row)
+                    continue
+                current["unique_count"] += row["unique_count"]
+                current["duplicate_count"] += row["duplicate_count"]
+                if row["first_seen"] and (not current["first_seen"] or row["first_seen"] < current["first_seen"]):
+                    current["first_seen"] = row["first_seen"]
+                if row["last_seen"] and (not current["last_seen"] or row["last_seen"] > current["last_seen"]):
+                    current["last_seen"] = row["last_seen"]
+                    current["last_event_id"] = row["last_event_id"] or current["last_event_id"]
+        return [merged[topic] for topic in sorted(merged)]
+
+    def partition_stats(self) -> List[Dict[str, Any]]:
+        merged: List[Dict[str, Any]] = []
+        for index, store in enumerate(self.stores):
+            merged.extend(dict(stats, shard=index) for stats in store.partition_stats())
+        return merged
+
+    def prefilter_stats(self) -> Optional[Dict[str, int]]:
+        merged: Optional[Dict[str, int]] = None
+        for store in self.stores:
+            stats = store.prefilter_stats()
+            if stats is None:
+                continue
+            if merged is None:
+                merged = dict.fromkeys(stats, 0)
+            for name, value in stats.items():
+                merged[name] += value
+        return merged
+
+    def migrate_payloads(self, batch_size: int = 1000) -> int:
+        return sum(store.migrate_payloads(batch_size) for store in self.stores)
+
+    def close(self):
+        for store in self.stores:
+            store.close()
@@ -0,0 +1,292 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+FSYNC_POLICIES = ("batch", "interval", "none")
+
+# Each record: payload length and crc32 of the payload, then the payload
+# (compact JSON list of events).
+RECORD_HEADER = struct.Struct(">II")
+
+Position = Tuple[int, int]  # (segment number, byte offset)
+
+
+class SpoolError(RuntimeError):
+    pass
+
+
+class Spool:
+    """Append-only, segmented log of accepted events for crash replay.
+
+    Records are appended in the order their tickets were reserved, which is
+    the order the chunks entered the ingest queue. The consumer acknowledges
+    tickets as it commits them; the checkpoint is the end of the last record
+    whose ticket and all earlier ones are acknowledged. On startup every
+    record past the checkpoint is replayed. Replay is idempotent because the
+    store drops duplicates, so the checkpoint file itself is not fsynced.
+
+    Segments entirely before the checkpoint are deleted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync: str = "batch",
+        fsync_interval_ms: float = 100.0,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unsupported spool fsync policy: {fsync!r}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._file = None
+        self._segment = 0
+        self._offset = 0
+        self._checkpoint: Position = (0, 0)
+        self._next_ticket = 0
+        self._acked = 0
+        # (ticket, end position) of records written but not yet acknowledged.
+        self._written: Deque[Tuple[int, Position]] = deque()
+        self._dirty = False
+        self._last_sync = 0.0
+        self.stats = {"appended_records": 0, "appended_bytes": 0, "fsyncs": 0, "replayed_events": 0}
+
+    # --- Lifecycle ---
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, "LOCK"), "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                self._lock_file = None
+                raise SpoolError(f"Spool directory is used by another process: {self.directory}")
+        self._checkpoint = self._read_checkpoint()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+            self._write_checkpoint()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # --- Files ---
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:012d}.log")
+
+    def segments(self) -> List[int]:
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".log") and name[:-4].isdigit())
+
+    def _read_checkpoint(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, "checkpoint")) as f:
+                segment, offset = f.read().split()
+            return int(segment), int(offset)
+        except (OSError, ValueError):
+            return (0, 0)
+
+    def _write_checkpoint(self):
+        path = os.path.join(self.directory, "checkpoint")
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self._checkpoint[0]} {self._checkpoint[1]}\n")
+        os.replace(path + ".tmp", path)
+
+    def _open_segment(self, segment: int):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+        self._segment = segment
+        self._file = open(self._segment_path(segment), "ab", buffering=0)
+        self._offset = self._file.tell()
+
+    def _sync(self):
+        if self._dirty and self.fsync != "none":
+            os.fsync(self._file.fileno())
+            self.stats["fsyncs"] += 1
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    # --- Replay ---
+
+    def replay(self) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the event lists of every record past the checkpoint.
+
+        A torn or corrupt record ends the log: the segment is truncated there
+        and later segments are discarded. Afterwards the spool is positioned
+        for appending and everything replayed counts as acknowledged once
+        ``finish_replay`` is called.
+        """
+        segments = [s for s in self.segments() if s >= self._checkpoint[0]]
+        for i, segment in enumerate(segments):
+            start = self._checkpoint[1] if segment == self._checkpoint[0] else 0
+            end, complete = yield from self._replay_segment(segment, start)
+            if not complete:
+                with open(self._segment_path(segment), "r+b") as f:
+                    f.truncate(end)
+                for later in segments[i + 1:]:
+                    os.remove(self._segment_path(later))
+                break
+
+    def _replay_segment(self, segment: int, offset: int):
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    return offset, True
+                if len(header) < RECORD_HEADER.size:
+                    return offset, False
+                length, crc = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    return offset, False
+                events = json.loads(data)
+                self.stats["replayed_events"] += len(events)
+                yield events
+                offset += RECORD_HEADER.size + length
+
+    def finish_replay(self):
+        """Mark everything on disk as consumed and open the newest segment for appends."""
+        with self._lock:
+            segments = self.segments()
+            self._open_segment(segments[-1] if segments else max(self._checkpoint[0], 0))
+            self._checkpoint = (self._segment, self._offset)
+            self._write_checkpoint()
+            self._recycle()
+
+    # --- Append / acknowledge ---
+
+    def reserve(self) -> int:
+        """Reserve the next ticket; call in the same step as the matching queue put."""
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        return ticket
+
+    def append(self, ticket: int, events: List[Dict[str, Any]]) -> Position:
+        """Write one record and apply the fsync policy; returns its end position.
+
+        Appends must be submitted in ticket order (one spool thread per shard).
+        """
+        data = json.dumps(events, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+        record = RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+        with self._lock:
+            if self._file is None:
+                raise SpoolError("Spool is not open")
+            if self._offset and self._offset + len(record) > self.segment_bytes:
+                self._open_segment(self._segment + 1)
+            self._file.write(record)
+            self._offset += len(record)
+            self._dirty = True
+            self.stats["appended_records"] += 1
+            self.stats["appended_bytes"] += len(record)
+            if self.fsync == "batch" or (
+                self.fsync == "interval" and time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync()
+            end = (self._segment, self._offset)
+            self._written.append((ticket, end))
+            self._advance()
+            return end
+
+    def flush(self):
+        """fsync pending writes; used by the ``interval`` policy's timer."""
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+
+    def ack(self, count: int):
+        """The consumer committed the next ``count`` queued chunks."""
+        with self._lock:
+            self._acked += count
+            self._advance()
+
+    def _advance(self):
+        checkpoint = self._checkpoint
+        while self._written and self._written[0][0] < self._acked:
+            _, checkpoint = self._written.popleft()
+        if checkpoint != self._checkpoint:
+            self._checkpoint = checkpoint
+            self._write_checkpoint()
+            self._recycle()
+
+    def _recycle(self):
+        for segment in self.segments():
+            if segment >= self._checkpoint[0]:
+                break
+            os.remove(self._segment_path(segment))
+
+    @property
+    def checkpoint(self) -> Position:
+        return self._checkpoint
+
+    def pending_records(self) -> int:
+        return len(self._written)
+
+
+# --- Worker slots ---
+
+
+def _slot_dirs(base_dir: str) -> List[str]:
+    names = os.listdir(base_dir) if os.path.isdir(base_dir) else []
+    slots = sorted(int(name[6:]) for name in names if name.startswith("worker") and name[6:].isdigit())
+    return [os.path.join(base_dir, f"worker{slot}") for slot in slots]
+
+
+def claim_spool(base_dir: str, **options) -> Spool:
+    """Open the first worker slot (``base_dir/worker<k>``) no other process holds.
+
+    Each process serving the same ``base_dir`` (e.g. ``uvicorn --workers N``)
+    gets a spool of its own; after a restart with the same worker count every
+    slot is claimed again, so nothing is left behind.
+    """
+    slot = 0
+    while True:
+        spool = Spool(os.path.join(base_dir, f"worker{slot}"), **options)
+        try:
+            spool.open()
+            return spool
+        except SpoolError:
+            slot += 1
+
+
+def orphaned_spools(base_dir: str, own: Spool, **options) -> Iterator[Spool]:
+    """Yield opened spools of slots no live process holds, for replay.
+
+    These are left by workers that are gone (e.g. the worker count shrank)
+    and by the pre-slot layout with segments directly in ``base_dir``. Slots
+    held by a running process are skipped. The caller replays each spool,
+    calls ``finish_replay`` and closes it.
+    """
+    candidates = _slot_dirs(base_dir)
+    if os.path.isdir(base_dir) and any(name.endswith(".log") for name in os.listdir(base_dir)):
+        candidates.insert(0, base_dir)
+    for directory in candidates:
+        if directory == own.directory:
+            continue
+        spool = Spool(directory, **options)
+        try:
+            spool.open()
+        except SpoolError:
+            continue
+        yield spool
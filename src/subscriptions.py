@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+# (shard, rowid, event)
+Item = Tuple[int, int, Dict[str, Any]]
+
+
+class Subscriber:
+    """Pending live events for one subscription.
+
+    ``push`` never blocks: when more than ``max_pending`` events pile up the
+    buffer is discarded and the subscription is flagged ``overflowed``; the
+    reader then catches up from the store instead (the events are already
+    committed there), so a slow client only ever costs its own reads.
+    """
+
+    def __init__(self, topic: str, max_pending: int):
+        self.topic = topic
+        self.max_pending = max_pending
+        self.pending: Deque[Item] = deque()
+        self.overflowed = False
+        self._wakeup = asyncio.Event()
+
+    def push(self, items: List[Item]):
+        if self.overflowed:
+            return
+        if len(self.pending) + len(items) > self.max_pending:
+            self.pending.clear()
+            self.overflowed = True
+        else:
+            self.pending.extend(items)
+        self._wakeup.set()
+
+    def take(self) -> List[Item]:
+        items = list(self.pending)
+        self.pending.clear()
+        return items
+
+    def reset(self):
+        self.pending.clear()
+        self.overflowed = False
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for new events or an overflow; False on timeout."""
+        if self.pending or self.overflowed:
+            return True
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class SubscriptionHub:
+    """Fan-out of newly committed unique events to live subscribers, per topic.
+
+    Topics that have a subscriber, or had one in the last ``retain_seconds``,
+    keep a ring of their last ``buffer_size`` events; other topics buffer
+    nothing, so memory is bounded by the subscribed topics, not all topics.
+    A ring holds every event of its topic with a rowid above the topic's
+    per-shard ``floor`` (the rowid last evicted, or the newest rowid when the
+    ring was created), so a resume cursor at or past the floor is served from
+    memory; anything older is read back from the store.
+
+    Only events committed by this process are pushed.
+    """
+
+    def __init__(self, num_shards: int, buffer_size: int = 1024, max_pending: int = 1000, retain_seconds: float = 300.0):
+        self.num_shards = num_shards
+        self.buffer_size = buffer_size
+        self.max_pending = max_pending
+        self.retain_seconds = retain_seconds
+        self._clock = time.monotonic
+        self._rings: Dict[str, Deque[Item]] = {}
+        self._floors: Dict[str, List[int]] = {}
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        # Topic -> when its last subscriber left; its ring is dropped after retain_seconds.
+        self._idle_since: Dict[str, float] = {}
+        self.last_rowids = [0] * num_shards
+        self.overflows = 0
+
+    def start(self, last_rowids: Sequence[int]):
+        """Set the newest committed rowid per shard, read from the store at startup."""
+        self.last_rowids = list(last_rowids)
+
+    def publish(self, shard: int, events: List[Dict[str, Any]], rowids: List[Optional[int]]):
+        """Called by the consumer after commit; ``rowids`` is None for duplicates."""
+        if self._idle_since:
+            self._sweep()
+        by_topic: Dict[str, List[Item]] = {}
+        for event, rowid in zip(events, rowids):
+            if rowid is not None:
+                by_topic.setdefault(event["topic"], []).append((shard, rowid, event))
+        for topic, items in by_topic.items():
+            ring = self._rings.get(topic)
+            if ring is None:
+                self.last_rowids[shard] = max(self.last_rowids[shard], items[-1][1])
+                continue
+            floors = self._floors[topic]
+            for item in items:
+                if len(ring) == ring.maxlen:
+                    evicted_shard, evicted_rowid, _ = ring[0]
+                    floors[evicted_shard] = max(floors[evicted_shard], evicted_rowid)
+                ring.append(item)
+            for subscriber in self._subscribers.get(topic, ()):
+                if not subscriber.overflowed:
+                    subscriber.push(items)
+                    self.overflows += subscriber.overflowed
+            self.last_rowids[shard] = max(self.last_rowids[shard], items[-1][1])
+
+    def subscribe(self, topic: str, positions: Optional[List[int]]) -> Tuple[Subscriber, Optional[List[Item]], List[int]]:
+        """Register a subscriber and return ``(subscriber, backlog, positions)``.
+
+        ``positions`` None means live only. The backlog is None when the ring
+        does not reach back to ``positions`` and the caller must read the store.
+        Registration and the ring snapshot happen in the same step, so the
+        backlog and the live events neither overlap nor leave a gap.
+        """
+        subscriber = Subscriber(topic, self.max_pending)
+        self._subscribers.setdefault(topic, set()).add(subscriber)
+        self._idle_since.pop(topic, None)
+        if topic not in self._rings:
+            # Nothing of this topic is buffered yet; from now on every new event is.
+            self._rings[topic] = deque(maxlen=self.buffer_size)
+            self._floors[topic] = list(self.last_rowids)
+        if positions is None:
+            return subscriber, [], list(self.last_rowids)
+        floors = self._floors[topic]
+        if any(pos < floor for pos, floor in zip(positions, floors)):
+            return subscriber, None, list(positions)
+        backlog = [item for item in self._rings.get(topic, ()) if item[1] > positions[item[0]]]
+        return subscriber, backlog, list(positions)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.topic]
+                self._idle_since[subscriber.topic] = self._clock()
+
+    def _sweep(self):
+        """Drop the rings of topics without subscribers for longer than retain_seconds."""
+        now = self._clock()
+        for topic, since in list(self._idle_since.items()):
+            if now - since > self.retain_seconds:
+                del self._rings[topic], self._floors[topic], self._idle_since[topic]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "buffered_topics": len(self._rings),
+            "buffered_events": sum(len(ring) for ring in self._rings.values()),
+            "overflows": self.overflows,
+        }
+
+
+def read_backlog(stores, topic: str, positions: List[int], chunk_size: int) -> Tuple[List[Item], bool]:
+    """One chunk per shard past ``positions``; returns ``(items, more)``."""
+    items: List[Item] = []
+    more = False
+    for shard, store in enumerate(stores):
+        page = store.list_events_page(topic, chunk_size, positions[shard])
+        items.extend((shard, rowid, event) for rowid, event in page)
+        more = more or len(page) == chunk_size
+    return items, more
@@ -0,0 +1,31 @@
+"""Helpers shared by the test modules."""
+import time
+
+DEFAULT_TIMESTAMP = "2025-10-24T00:00:00Z"
+
+
+def make_event(topic, event_id, timestamp=DEFAULT_TIMESTAMP, source="s", **payload):
+    """Event dict as accepted by /publish; keyword arguments become the payload."""
+    return {"topic": topic, "event_id": event_id, "timestamp": timestamp, "source": source, "payload": payload}
+
+
+def wait_until(predicate, timeout=5.0, interval=0.02, what="condition"):
+    """Poll ``predicate`` until it returns a truthy value and return that value; fail on timeout."""
+    deadline = time.time() + timeout
+    while True:
+        result = predicate()
+        if result:
+            return result
+        if time.time() >= deadline:
+            raise AssertionError(f"Timed out after {timeout}s waiting for {what}")
+        time.sleep(interval)
+
+
+def wait_processed(client, n, timeout=5.0):
+    """Wait until the app behind ``client`` has written ``n`` events (unique or duplicate); returns /stats."""
+
+    def stats_if_done():
+        stats = client.get("/stats").json()
+        return stats if stats["unique_processed"] + stats["duplicate_dropped"] >= n else None
+
+    return wait_until(stats_if_done, timeout, what=f"{n} processed event(s)")
@@ -8,6 +8,7 @@ from fastapi.testclient import TestClient
 
 from src.main import create_app
 from src.dedup import DedupStore
+from tests.helpers import wait_processed
 
 
 def test_dedup_basic(tmp_path):
@@ -87,3 +88,104 @@ def test_batch_publish_and_stats(tmp_path):
         # received should be 200 (enqueued), unique_processed <=200 and duplicates dropped >0
         assert stats["received"] >= 200
         assert stats["unique_processed"] + stats["duplicate_dropped"] >= 200
+
+
+def test_record_events_bulk(tmp_path):
+    store = DedupStore(str(tmp_path / "dedup.db"))
+    store.init_db()
+    store.record_event("bulk", "a", "2025-10-24T00:00:00Z", "s", {})
+    batch = [
+        {"topic": "bulk", "event_id": eid, "timestamp": "2025-10-24T00:00:00Z", "source": "s", "payload": {}}
+        for eid in ["a", "b", "c", "b"]
+    ]
+    assert store.record_events(batch) == [False, True, True, False]
+    assert len(store.list_events("bulk")) == 3
+    store.close()
+
+
+def test_store_pragmas(tmp_path):
+    store = DedupStore(str(tmp_path / "dedup.db"), journal_mode="wal", synchronous="normal")
+    store.init_db()
+    assert store._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert store._conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    store.close()
+    try:
+        DedupStore(str(tmp_path / "x.db"), synchronous="FULL; DROP TABLE events")
+        assert False, "invalid pragma value accepted"
+    except ValueError:
+        pass
+
+
+def test_batched_consumer_exact_counts(tmp_path):
+    from src.config import Settings
+
+    app = create_app(str(tmp_path / "dedup.db"), Settings(batch_size=50, batch_wait_ms=20))
+    with TestClient(app) as client:
+        events = [
+            {"topic": "batch", "event_id": f"id-{i % 160}", "timestamp": "2025-10-24T00:00:00Z", "source": "t", "payload": {}}
+            for i in range(200)
+        ]
+        assert client.post("/publish", json=events).status_code == 202
+        wait_processed(client, 200)
+        stats = client.get("/stats").json()
+        assert stats["unique_processed"] == 160
+        assert stats["duplicate_dropped"] == 40
+
+
+def test_topic_stats_survive_restart(tmp_path):
+    db = str(tmp_path / "dedup.db")
+    store = DedupStore(db)
+    store.init_db()
+    batch = [
+        {"topic": topic, "event_id": eid, "timestamp": "2025-10-24T00:00:00Z", "source": "s", "payload": {}}
+        for topic, eid in [("a", "1"), ("a", "2"), ("a", "1"), ("b", "9")]
+    ]
+    store.record_events(batch)
+    store.record_event("a", "2", "2025-10-24T00:00:00Z", "s", {})
+    store.close()
+
+    store2 = DedupStore(db)
+    store2.init_db()
+    stats = {row["topic"]: row for row in store2.topic_stats()}
+    assert stats["a"]["unique_count"] == 2 and stats["a"]["duplicate_count"] == 2
+    assert stats["a"]["last_event_id"] == "2"
+    assert stats["b"]["unique_count"] == 1 and stats["b"]["first_seen"] is not None
+    assert store2.list_topics() == ["a", "b"]
+    store2.close()
+
+
+def test_topic_stats_backfilled_for_old_databases(tmp_path):
+    db = tmp_path / "dedup.db"
+    conn = sqlite3.connect(str(db))
+    conn.execute(
+        "CREATE TABLE events (topic TEXT NOT NULL, event_id TEXT NOT NULL, timestamp TEXT, source TEXT, payload TEXT, PRIMARY KEY (topic, event_id))"
+    )
+    conn.executemany("INSERT INTO events VALUES (?, ?, '', '', '{}')", [("old", "x"), ("old", "y"), ("other", "z")])
+    conn.commit()
+    conn.close()
+
+    store = DedupStore(str(db))
+    store.init_db()
+    stats = {row["topic"]: row for row in store.topic_stats()}
+    assert stats["old"]["unique_count"] == 2 and stats["old"]["last_event_id"] == "y"
+    assert stats["other"]["unique_count"] == 1
+    store.close()
+
+
+def test_stats_topics_endpoint(tmp_path):
+    from src.config import Settings
+
+    app = create_app(str(tmp_path / "dedup.db"), Settings(shards=2))
+    with TestClient(app) as client:
+        events = [
+            {"topic": "st", "event_id": f"id-{i % 5}", "timestamp": "2025-10-24T00:00:00Z", "source": "t", "payload": {}}
+            for i in range(8)
+        ]
+        client.post("/publish", json=events)
+        wait_processed(client, 8)
+        topics = client.get("/stats/topics").json()
+        assert topics[0]["topic"] == "st"
+        assert topics[0]["unique_count"] == 5 and topics[0]["duplicate_count"] == 3
+        stats = client.get("/stats").json()
+        assert stats["topics"] == ["st"]
+        assert stats["persisted"] == {"unique_events": 5, "duplicates_dropped": 3}
@@ -0,0 +1,245 @@
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import EventStore, bitcask_dir, create_store
+from src.bitcask import BitcaskError, BitcaskStore
+from src.config import Settings
+from src.dedup import DedupStore
+from src.main import create_app
+from tests.helpers import make_event, wait_processed
+
+
+def _sqlite(path):
+    return DedupStore(str(path / "dedup.db"), journal_mode="WAL", lru_size=100)
+
+
+def _bitcask(path):
+    return BitcaskStore(str(path / "dedup.bitcask"), max_file_bytes=512, merge_min_files=2)
+
+
+@pytest.fixture(params=[_sqlite, _bitcask], ids=["sqlite", "bitcask"])
+def make_store(request, tmp_path):
+    """Factory for a backend rooted in tmp_path; calling it again reopens the same data."""
+    opened = []
+
+    def make():
+        store = request.param(tmp_path)
+        store.init_db()
+        opened.append(store)
+        return store
+
+    yield make
+    for store in opened:
+        store.close()
+
+
+# --- Conformance: every backend must pass these ---
+
+
+def test_record_and_duplicates(make_store):
+    store = make_store()
+    assert isinstance(store, EventStore)
+    assert store.record_event("a", "1", "2025-10-24T00:00:00Z", "s", {"n": 1}) is True
+    assert store.record_event("a", "1", "2025-10-24T00:00:00Z", "s", {"n": 1}) is False
+    # Same event_id on another topic is a different key.
+    assert store.record_events([make_event("b", "1"), make_event("a", "2"), make_event("a", "2"), make_event("a", "1")]) == [True, True, False, False]
+    assert store.list_topics() == ["a", "b"]
+
+
+def test_rowids_increase_and_page(make_store):
+    store = make_store()
+    rowids = store.record_events_rowids([make_event("a", str(i), n=i) for i in range(5)] + [make_event("a", "0")])
+    assert rowids[-1] is None
+    assert rowids[:5] == sorted(rowids[:5]) and len(set(rowids[:5])) == 5
+    assert store.last_rowid() == rowids[4]
+    page = store.list_events_page("a", limit=2, after=rowids[1])
+    assert [row["event_id"] for _, row in page] == ["2", "3"]
+    assert page[0][1] == make_event("a", "2", n=2)
+    assert [r["event_id"] for r in store.list_events()] == ["0", "1", "2", "3", "4"]
+    assert [rowid for rowid, _ in store.iter_events(chunk_size=2)] == rowids[:5]
+
+
+def test_filters(make_store):
+    store = make_store()
+    store.record_events(
+        [
+            make_event("a", "1", timestamp="2025-01-01T00:00:00Z", user={"id": 1}),
+            make_event("a", "2", timestamp="2025-02-01T00:00:00Z", user={"id": 2}),
+            make_event("b", "3", timestamp="2025-03-01T00:00:00Z", user={"id": 1}),
+        ]
+    )
+    assert [r["event_id"] for r in store.list_events(since="2025-01-15T00:00:00Z")] == ["2", "3"]
+    assert [r["event_id"] for r in store.list_events(until="2025-02-01T00:00:00Z")] == ["1", "2"]
+    assert [r["event_id"] for r in store.list_events(payload_filters={"user.id": 1})] == ["1", "3"]
+    assert [r["event_id"] for r in store.list_events("a", payload_filters={"user.id": 1})] == ["1"]
+
+
+def test_topic_stats(make_store):
+    store = make_store()
+    store.record_events([make_event("a", "1"), make_event("a", "2"), make_event("a", "1"), make_event("b", "9")])
+    stats = {row["topic"]: row for row in store.topic_stats()}
+    assert stats["a"]["unique_count"] == 2
+    assert stats["a"]["duplicate_count"] == 1
+    assert stats["a"]["last_event_id"] == "2"
+    assert stats["a"]["first_seen"] and stats["a"]["last_seen"]
+    assert stats["b"]["unique_count"] == 1
+
+
+def test_survives_reopen(make_store):
+    store = make_store()
+    store.record_events([make_event("a", str(i), n=i) for i in range(50)])
+    store.record_events([make_event("a", "1")])
+    last = store.last_rowid()
+    store.close()
+    reopened = make_store()
+    assert reopened.record_events([make_event("a", "7"), make_event("a", "new")]) == [False, True]
+    assert reopened.last_rowid() > last
+    assert len(reopened.list_events("a")) == 51
+    assert {row["topic"]: row["duplicate_count"] for row in reopened.topic_stats()} == {"a": 2}
+
+
+def test_merge_keeps_every_event(make_store):
+    store = make_store()
+    for i in range(40):
+        store.record_events([make_event("a", f"{i}-{j}", n=j) for j in range(3)])
+    before = store.list_events_page()
+    store.merge()
+    assert store.list_events_page() == before
+    assert store.record_events([make_event("a", "0-0")]) == [False]
+
+
+# --- Bitcask specifics ---
+
+
+def test_bitcask_rebuilds_keydir_from_hints(tmp_path):
+    store = _bitcask(tmp_path)
+    store.init_db()
+    store.record_events([make_event("a", str(i), blob="x" * 100) for i in range(20)])
+    store.close()
+    names = os.listdir(store.directory)
+    hints = [n for n in names if n.endswith(".hint")]
+    assert hints and len(hints) == len([n for n in names if n.endswith(".data")])
+
+    reopened = _bitcask(tmp_path)
+    reopened.init_db()
+    assert reopened.record_events([make_event("a", "3")]) == [False]
+    assert reopened.list_events_page("a", limit=1, after=2)[0][1]["event_id"] == "2"
+    reopened.close()
+
+
+def test_bitcask_crash_truncates_torn_batch(tmp_path):
+    store = _bitcask(tmp_path)
+    store.init_db()
+    store.record_events([make_event("a", "1"), make_event("a", "2")])
+    store.record_events([make_event("a", "3"), make_event("a", "4")])
+    # Simulate a crash halfway through writing the second batch: no close, no hint.
+    path = store._path(store._active_id, "data")
+    size = os.path.getsize(path)
+    last = store._sizes[-1]
+    os.truncate(path, size - last // 2)
+    # The dead process's flock goes away with it.
+    store._lock_file.close()
+
+    recovered = _bitcask(tmp_path)
+    recovered.init_db()
+    assert [r["event_id"] for r in recovered.list_events()] == ["1", "2"]
+    assert recovered.stats["truncated_bytes"] > 0
+    # The lost batch can be written again (e.g. replayed from the spool).
+    assert recovered.record_events([make_event("a", "3"), make_event("a", "4")]) == [True, True]
+    recovered.close()
+
+
+def test_bitcask_merge_reduces_files(tmp_path):
+    store = _bitcask(tmp_path)
+    store.init_db()
+    for i in range(30):
+        store.record_events([make_event("a", str(i), blob="x" * 100)])
+    files_before = store.file_stats()["files"]
+    assert files_before > 3
+    assert store.merge() == files_before - 1
+    # The merged file, the file that was active when the merge started, and a new active file.
+    assert store.file_stats()["files"] == 3
+    assert len([n for n in os.listdir(store.directory) if n.endswith(".data")]) == 3
+    store.close()
+
+    reopened = _bitcask(tmp_path)
+    reopened.init_db()
+    assert [r["event_id"] for r in reopened.list_events()] == [str(i) for i in range(30)]
+    reopened.close()
+
+
+def test_bitcask_reads_outside_the_writer_lock(tmp_path):
+    store = _bitcask(tmp_path)
+    store.init_db()
+    for i in range(0, 300, 10):
+        store.record_events([make_event("a", str(j), blob="x" * 50) for j in range(i, i + 10)])
+    expected = store.list_events_page()
+    decode = store._decode
+    reading, release = threading.Event(), threading.Event()
+
+    def slow_decode(data):
+        reading.set()
+        release.wait(5)
+        return decode(data)
+
+    store._decode = slow_decode
+    result = []
+    reader = threading.Thread(target=lambda: result.extend(store.list_events_page()))
+    reader.start()
+    try:
+        assert reading.wait(5)
+        # Writes and a merge (which closes and deletes files being read) go ahead mid-read.
+        assert store.record_events([make_event("a", "new")]) == [True]
+        assert store.merge() > 0
+    finally:
+        release.set()
+        reader.join(5)
+    assert result[:300] == expected and result[300][1]["event_id"] == "new"
+    store.close()
+
+
+def test_bitcask_rejects_keys_longer_than_the_record_format_allows(tmp_path):
+    store = _bitcask(tmp_path)
+    store.init_db()
+    with pytest.raises(ValueError):
+        store.record_events([make_event("a", "1"), make_event("t" * 70000, "2")])
+    # Nothing from the rejected batch was written.
+    assert store.record_events([make_event("a", "1")]) == [True]
+    store.close()
+
+
+def test_bitcask_directory_is_locked(tmp_path):
+    store = _bitcask(tmp_path)
+    store.init_db()
+    with pytest.raises(BitcaskError):
+        _bitcask(tmp_path).init_db()
+    store.close()
+    # Released on close.
+    reopened = _bitcask(tmp_path)
+    reopened.init_db()
+    reopened.close()
+
+
+def test_create_store_selects_backend(tmp_path):
+    db = str(tmp_path / "dedup.db")
+    assert isinstance(create_store(db, Settings()), DedupStore)
+    bitcask = create_store(db, Settings(backend="bitcask"))
+    assert isinstance(bitcask, BitcaskStore) and bitcask.directory == bitcask_dir(db) == str(tmp_path / "dedup.bitcask")
+    with pytest.raises(ValueError):
+        create_store(db, Settings(backend="lsm"))
+    with pytest.raises(ValueError):
+        create_store(db, Settings(backend="bitcask", retention_days=1))
+
+
+def test_app_with_bitcask_backend(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(backend="bitcask", shards=2))
+    with TestClient(app) as client:
+        events = [make_event(f"t{i % 20 % 3}", f"id-{i % 20}") for i in range(30)]
+        assert client.post("/publish", json=events).status_code == 202
+        stats = wait_processed(client, 30)
+        assert stats["unique_processed"] == 20
+        assert stats["persisted"]["unique_events"] == 20
+        assert len(client.get("/events").json()) == 20
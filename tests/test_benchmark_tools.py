@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from loadgen import InProcessServer, generate_batches, percentile, run_load  # noqa: E402
+from microbench import run_microbench  # noqa: E402
+
+from src.config import Settings  # noqa: E402
+
+
+def test_generated_load_has_duplicates_and_skew():
+    events = [ev for batch in generate_batches(5000, 64, dup_ratio=0.3, zipf=1.2, topics=4, seed=1) for ev in batch]
+    assert len(events) == 5000
+    ids = [ev["event_id"] for ev in events]
+    assert 0.25 < 1 - len(set(ids)) / len(ids) < 0.35
+    # Zipf: the hottest key is re-sent far more often than a mid-rank key.
+    assert ids.count("ev-0") > 10 * max(1, ids.count("ev-500"))
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0 and percentile([], 99) is None
+
+
+def test_run_load_against_in_process_app(tmp_path):
+    settings = Settings(log_events_per_second=0)
+    with InProcessServer(str(tmp_path / "bench.db"), settings) as server:
+        report = asyncio.run(run_load(server.url, events=600, concurrency=4, batch_size=50, dup_ratio=0.25, seed=2))
+    assert report["accepted_events"] == 600 and report["status_codes"] == {"202": 12}
+    assert report["unique_processed"] + report["duplicate_dropped"] == 600
+    assert report["lag"]["drain_seconds"] is not None
+    assert report["publish_latency_ms"]["p50"] <= report["publish_latency_ms"]["p99"]
+
+
+def test_microbench_reports_each_path():
+    report = run_microbench(events=500, batch_size=50, page_size=100, store_kwargs={"lru_size": 100})
+    assert set(report["results"]) == {"insert", "duplicate", "list", "prefilter"}
+    assert report["results"]["list"]["ops"] == 500
@@ -0,0 +1,83 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.codec import FORMAT_JSON, FORMAT_ZJSON, PayloadCodec, filter_value, payload_path
+from src.config import Settings
+from src.dedup import DedupStore
+from src.main import create_app
+from tests.helpers import make_event, wait_processed
+
+
+def test_codec_roundtrip_and_compression():
+    codec = PayloadCodec(compress_threshold=64)
+    small, fmt = codec.encode({"b": 1, "a": "x"})
+    assert (small, fmt) == ('{"a":"x","b":1}', FORMAT_JSON)
+    big_payload = {"text": "y" * 500}
+    packed, fmt = codec.encode(big_payload)
+    assert fmt == FORMAT_ZJSON and len(packed) < 100
+    assert codec.decode(packed, fmt) == big_payload
+    assert codec.decode("{'a': 1}", None) == {"a": 1}
+    assert codec.decode("not a literal", None) == "not a literal"
+
+
+def test_filter_helpers():
+    assert payload_path("user.id") == '$."user"."id"'
+    with pytest.raises(ValueError):
+        payload_path("a[0]")
+    assert filter_value("42") == 42 and filter_value("true") is True and filter_value("abc") == "abc"
+
+
+def test_payload_filters_cover_json_compressed_and_legacy_rows(tmp_path):
+    db = tmp_path / "dedup.db"
+    conn = sqlite3.connect(str(db))
+    conn.execute(
+        "CREATE TABLE events (topic TEXT NOT NULL, event_id TEXT NOT NULL, timestamp TEXT, source TEXT, payload TEXT, PRIMARY KEY (topic, event_id))"
+    )
+    conn.executemany(
+        "INSERT INTO events VALUES ('c', ?, '2025-10-24T00:00:00Z', 's', ?)",
+        [("legacy-1", str({"level": "error", "n": 1})), ("legacy-2", str({"level": "info"}))],
+    )
+    conn.commit()
+    conn.close()
+
+    store = DedupStore(str(db), payload_compress_threshold=100)
+    store.init_db()
+    store.record_events([
+        make_event("c", "id-1", level="error", user={"id": 7}),
+        make_event("c", "id-2", level="info"),
+        make_event("c", "id-3", level="error", blob="z" * 1000),
+    ])
+    assert store.list_events("c")[0]["payload"] == {"level": "error", "n": 1}
+
+    ids = [r["event_id"] for r in store.list_events(payload_filters={"level": "error"})]
+    assert ids == ["legacy-1", "id-1", "id-3"]
+    assert [r["event_id"] for r in store.list_events(payload_filters={"user.id": 7})] == ["id-1"]
+
+    # Short pages only at the end, even when rows are dropped after decoding.
+    page = store.list_events_page(limit=2, payload_filters={"level": "error"})
+    assert [r["event_id"] for _, r in page] == ["legacy-1", "id-1"]
+    page2 = store.list_events_page(limit=2, after=page[-1][0], payload_filters={"level": "error"})
+    assert [r["event_id"] for _, r in page2] == ["id-3"]
+
+    # null matches a missing or null field the same way in SQL and after decoding.
+    missing = [r["event_id"] for r in store.list_events(payload_filters={"user.id": None})]
+    assert missing == ["legacy-1", "legacy-2", "id-2", "id-3"]
+
+    assert store.migrate_payloads(batch_size=1) == 2
+    formats = dict(store._conn.execute("SELECT event_id, payload_format FROM events").fetchall())
+    assert formats["legacy-1"] == FORMAT_JSON and formats["id-3"] == FORMAT_ZJSON
+    assert store.list_events(payload_filters={"n": 1})[0]["event_id"] == "legacy-1"
+    store.close()
+
+
+def test_events_endpoint_returns_objects_and_filters(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(shards=2))
+    with TestClient(app) as client:
+        client.post("/publish", json=[make_event("c", f"id-{i}", level="error" if i % 2 else "info", n=i) for i in range(6)])
+        wait_processed(client, 6)
+        events = client.get("/events", params={"topic": "c", "payload.level": "error"}).json()
+        assert sorted(e["payload"]["n"] for e in events) == [1, 3, 5]
+        assert client.get("/events", params={"payload.n": "4"}).json()[0]["payload"] == {"level": "info", "n": 4}
+        assert client.get("/events", params={"payload.a]": "1"}).status_code == 400
@@ -0,0 +1,81 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.dedup import DedupStore
+from src.main import create_app
+from tests.helpers import make_event, wait_processed
+
+
+def test_store_keyset_pages_and_time_filters(tmp_path):
+    store = DedupStore(str(tmp_path / "dedup.db"))
+    store.init_db()
+    store.record_events([make_event("a" if i % 2 else "b", f"id-{i}", timestamp=f"2025-10-24T00:00:{i:02d}Z") for i in range(20)])
+
+    page = store.list_events_page("a", limit=4)
+    assert [row["event_id"] for _, row in page] == ["id-1", "id-3", "id-5", "id-7"]
+    page2 = store.list_events_page("a", limit=4, after=page[-1][0])
+    assert [row["event_id"] for _, row in page2] == ["id-9", "id-11", "id-13", "id-15"]
+
+    rows = store.list_events(since="2025-10-24T00:00:05Z", until="2025-10-24T00:00:08Z")
+    assert [r["event_id"] for r in rows] == ["id-5", "id-6", "id-7", "id-8"]
+
+    streamed = [row["event_id"] for _, row in store.iter_events("b", chunk_size=3)]
+    assert streamed == [f"id-{i}" for i in range(0, 20, 2)]
+
+    plan = store._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM events WHERE topic = ? AND rowid > ? ORDER BY rowid", ("a", 0)
+    ).fetchall()
+    assert "idx_events_topic" in str(plan)
+    store.close()
+
+
+def _collect_pages(client, **params):
+    seen, cursor = [], None
+    while True:
+        query = dict(params)
+        if cursor:
+            query["after"] = cursor
+        r = client.get("/events", params=query)
+        assert r.status_code == 200
+        seen.extend(e["event_id"] for e in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+
+
+def test_events_endpoint_pagination_and_ndjson(tmp_path):
+    for shards in (1, 3):
+        app = create_app(str(tmp_path / f"s{shards}" / "dedup.db"), Settings(shards=shards))
+        with TestClient(app) as client:
+            client.post("/publish", json=[make_event("page", f"id-{i}", timestamp=f"2025-10-24T00:00:{i:02d}Z") for i in range(50)])
+            wait_processed(client, 50)
+
+            ids = _collect_pages(client, topic="page", limit=7)
+            assert sorted(ids) == sorted(f"id-{i}" for i in range(50))
+            assert len(ids) == 50
+
+            r = client.get("/events", params={"format": "ndjson", "limit": 10})
+            assert r.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in r.text.splitlines()]
+            assert len(lines) == 10
+
+            r = client.get("/events", headers={"Accept": "application/x-ndjson"}, params={"since": "2025-10-24T00:00:45Z"})
+            assert sorted(json.loads(line)["event_id"] for line in r.text.splitlines()) == [f"id-{i}" for i in range(45, 50)]
+
+            assert client.get("/events", params={"after": "x"}).status_code == 400
+
+
+def test_events_without_limit_returns_one_page(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(shards=2, events_page_size=8))
+    with TestClient(app) as client:
+        client.post("/publish", json=[make_event("page", f"id-{i}", timestamp=f"2025-10-24T00:00:{i:02d}Z") for i in range(20)])
+        wait_processed(client, 20)
+
+        first = client.get("/events")
+        assert len(first.json()) == 8 and first.headers["X-Next-Cursor"]
+        assert sorted(_collect_pages(client)) == sorted(f"id-{i}" for i in range(20))
+
+        everything = client.get("/events", params={"all": "true"})
+        assert len(everything.json()) == 20 and "X-Next-Cursor" not in everything.headers
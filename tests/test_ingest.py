@@ -0,0 +1,121 @@
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.ingest import MAX_KEY_LENGTH, BodyDecoder, BodyTooLarge, InvalidBody, LineSplitter, validate_batch
+from src.main import create_app
+from tests.helpers import make_event, wait_processed
+
+
+def test_validate_batch_reports_bad_records_by_index():
+    valid, invalid = validate_batch(json.dumps([make_event("ing", "id-0", n=0), {"topic": "x"}, make_event("ing", "id-2", n=2), 5]).encode())
+    assert [i for i, _ in valid] == [0, 2]
+    assert valid[1][1]["payload"] == {"n": 2}
+    assert [e["index"] for e in invalid] == [1, 3]
+    assert {"loc": ["event_id"], "msg": "Field required", "type": "missing"} in invalid[0]["errors"]
+
+    too_long = make_event("t" * (MAX_KEY_LENGTH + 1), "id-1", n=1)
+    valid, invalid = validate_batch(json.dumps([too_long, make_event("ing", "id-2", n=2)]).encode())
+    assert [i for i, _ in valid] == [1] and invalid[0]["errors"][0]["loc"] == ["topic"]
+
+    valid, invalid = validate_batch(json.dumps(make_event("ing", "id-7", n=7)).encode())
+    assert valid == [(0, make_event("ing", "id-7", n=7))] and invalid == []
+
+    for body in (b"[{", b"42", b"not json"):
+        with pytest.raises(InvalidBody):
+            validate_batch(body)
+
+
+def test_body_decoder_and_line_splitter():
+    raw = b"\n".join(json.dumps(make_event("ing", f"id-{i}", n=i)).encode() for i in range(3))
+    compressed = gzip.compress(raw)
+    decoder = BodyDecoder("gzip")
+    out = decoder.decode(compressed[:10]) + decoder.decode(compressed[10:]) + decoder.flush()
+    assert out == raw
+
+    splitter = LineSplitter()
+    lines = splitter.feed(raw[:30]) + splitter.feed(raw[30:]) + splitter.finish()
+    assert [json.loads(line)["event_id"] for line in lines] == ["id-0", "id-1", "id-2"]
+
+    with pytest.raises(BodyTooLarge):
+        BodyDecoder("gzip", max_bytes=100).decode(gzip.compress(b"x" * 10000))
+    with pytest.raises(InvalidBody):
+        BodyDecoder("br")
+
+
+def test_publish_accepts_valid_records_and_reports_invalid(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"))
+    with TestClient(app) as client:
+        r = client.post("/publish", json=[make_event("ing", "id-0", n=0), {"topic": "ing", "event_id": "bad"}, make_event("ing", "id-2", n=2)])
+        assert r.status_code == 202
+        assert r.json()["accepted"] == 2
+        assert [e["index"] for e in r.json()["invalid"]] == [1]
+
+        r = client.post("/publish", json=[{"topic": "only-bad"}])
+        assert r.status_code == 422
+
+        body = gzip.compress(json.dumps([make_event("ing", "id-3", n=3), make_event("ing", "id-4", n=4)]).encode())
+        r = client.post("/publish", content=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+        assert r.status_code == 202 and r.json()["accepted"] == 2
+
+        wait_processed(client, 4)
+        assert sorted(e["event_id"] for e in client.get("/events", params={"topic": "ing"}).json()) == ["id-0", "id-2", "id-3", "id-4"]
+
+
+def test_publish_ndjson_streaming(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(batch_size=4, shards=2))
+    lines = [json.dumps(make_event("ing", f"id-{i}", n=i)) for i in range(10)]
+    lines.insert(3, '{"topic": "ing"}')
+    lines.insert(6, "")
+    body = gzip.compress(("\n".join(lines) + "\n").encode())
+    with TestClient(app) as client:
+        r = client.post(
+            "/publish/ndjson",
+            content=body,
+            headers={"Content-Encoding": "gzip", "Content-Type": "application/x-ndjson"},
+        )
+        assert r.status_code == 202
+        assert r.json()["accepted"] == 10
+        assert [e["index"] for e in r.json()["invalid"]] == [3]
+        wait_processed(client, 10)
+        assert len(client.get("/events", params={"topic": "ing"}).json()) == 10
+
+
+def test_publish_ndjson_error_reports_chunks_already_queued(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(batch_size=2, max_body_bytes=1000))
+    body = "".join(json.dumps(make_event("ing", f"id-{i}", n=i)) + "\n" for i in range(20)).encode()
+
+    async def chunks():
+        for start in range(0, len(body), 100):
+            yield body[start:start + 100]
+
+    async def run():
+        # ASGITransport hands the body to the app chunk by chunk, unlike TestClient.
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.post("/publish/ndjson", content=chunks(), headers={"Content-Type": "application/x-ndjson"})
+                for _ in range(250):
+                    stats = (await client.get("/stats")).json()
+                    if stats["unique_processed"] >= r.json()["accepted"]:
+                        break
+                    await asyncio.sleep(0.02)
+                return r, stats
+
+    r, stats = asyncio.run(run())
+    assert r.status_code == 413
+    accepted = r.json()["accepted"]
+    assert 0 < accepted < 20
+    assert [q["index"] for q in r.json()["queued"]] == list(range(accepted))
+    assert stats["received"] == stats["unique_processed"] == accepted
+
+
+def test_publish_body_too_large(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(max_body_bytes=50))
+    client = TestClient(app)
+    assert client.post("/publish", json=[make_event("ing", f"id-{i}", n=i) for i in range(5)]).status_code == 413
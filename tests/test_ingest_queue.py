@@ -0,0 +1,58 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.ingest_queue import EventQueue
+from src.main import create_app
+from tests.helpers import make_event
+
+
+def test_queue_bounds_by_events_and_bytes():
+    async def scenario():
+        q = EventQueue(max_events=3, max_bytes=100)
+        assert q.put_nowait("a", count=2, nbytes=10)
+        assert not q.put_nowait("b", count=2, nbytes=10)
+        assert q.put_nowait("c", count=1, nbytes=10)
+        assert q.qsize() == 3 and q.nbytes == 20
+        assert await q.get() == "a"
+        assert not q.put_nowait("d", count=1, nbytes=95)
+        # An empty queue accepts any single item.
+        assert q.get_nowait() == "c"
+        assert q.put_nowait("e", count=10, nbytes=1000)
+
+    asyncio.run(scenario())
+
+
+def test_queue_put_waits_for_space_with_timeout():
+    async def scenario():
+        q = EventQueue(max_events=1)
+        q.put_nowait("a")
+        assert await q.put("b", timeout=0.01) is False
+        waiter = asyncio.ensure_future(q.put("b", timeout=1.0))
+        await asyncio.sleep(0.01)
+        assert q.get_nowait() == "a"
+        assert await waiter is True
+        assert q.get_nowait() == "b"
+        q.task_done()
+        q.task_done()
+        await asyncio.wait_for(q.join(), 1.0)
+
+    asyncio.run(scenario())
+
+
+def test_publish_sheds_load_when_queue_full(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(queue_max_events=3, retry_after_seconds=2))
+    # Without the lifespan context no consumer runs, so the queue only fills up.
+    client = TestClient(app)
+    r = client.post("/publish?on_full=reject", json=[make_event("bp", f"id-{i}") for i in range(5)])
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "2"
+    body = r.json()
+    assert body["accepted"] == 3 and body["rejected"] == 2
+    assert [q["index"] for q in body["queued"]] == [0, 1, 2]
+
+    r = client.post("/publish?wait_ms=20", json=make_event("bp", "id-9"))
+    assert r.status_code == 503
+    assert r.json()["queued"] == []
+    assert app.state.shards[0].queue.qsize() == 3
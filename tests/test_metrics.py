@@ -0,0 +1,62 @@
+import logging
+
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.main import create_app
+from src.metrics import Histogram, RateLimitedLogger
+from tests.helpers import make_event, wait_processed
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("x_seconds", "help", (0.1, 1.0), ("stage",))
+    h.observe(0.05, "a")
+    h.observe(0.5, "a")
+    h.observe(5.0, "a")
+    lines = h.render()
+    assert 'x_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'x_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'x_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'x_seconds_count{stage="a"} 3' in lines
+
+    # A weighted observation counts as n equal observations.
+    h.observe(0.5, "b", n=4)
+    lines = h.render()
+    assert 'x_seconds_bucket{stage="b",le="0.1"} 0' in lines
+    assert 'x_seconds_bucket{stage="b",le="1.0"} 4' in lines
+    assert 'x_seconds_sum{stage="b"} 2.0' in lines and 'x_seconds_count{stage="b"} 4' in lines
+
+
+def test_rate_limited_logger(caplog):
+    now = [0.0]
+    log = RateLimitedLogger(logging.getLogger("test-rl"), 2, clock=lambda: now[0])
+    with caplog.at_level(logging.INFO, logger="test-rl"):
+        for _ in range(5):
+            log.info("event %s", 1)
+        now[0] = 1.5
+        log.info("event %s", 2)
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages == ["event 1", "event 1", "... 3 similar log line(s) suppressed", "event 2"]
+
+
+def test_metrics_endpoint(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"))
+    with TestClient(app) as client:
+        ev = make_event("m", "1")
+        client.post("/publish", json=[ev, ev])
+        wait_processed(client, 2)
+        text = client.get("/metrics").text
+    for stage in ("parse", "validate", "enqueue", "queue_wait", "db_write", "ingest_to_durable"):
+        assert f'aggregator_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'aggregator_consumer_batch_size_count{shard="0"}' in text
+    # Per-event stages still count every event, recorded once per queue item.
+    assert 'aggregator_stage_seconds_count{stage="queue_wait"} 2' in text
+    assert 'aggregator_stage_seconds_count{stage="ingest_to_durable"} 2' in text
+    assert 'aggregator_queue_depth_events{shard="0"} 0' in text
+    assert 'aggregator_events_total{outcome="duplicate_dropped"} 1' in text
+
+
+def test_metrics_disabled(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(metrics_enabled=False))
+    with TestClient(app) as client:
+        assert client.get("/metrics").status_code == 404
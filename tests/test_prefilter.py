@@ -0,0 +1,80 @@
+from src.dedup import DedupStore
+from src.prefilter import BloomFilter, DedupPrefilter, RecentKeys
+from tests.helpers import make_event
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [("t", f"id-{i}") for i in range(1000)]
+    for k in keys:
+        bloom.add(k)
+    assert all(k in bloom for k in keys)
+    false_positives = sum(("t", f"other-{i}") in bloom for i in range(10000))
+    assert false_positives < 500
+    assert bloom.size_bytes < 2000
+
+
+def test_recent_keys_evicts_least_recent():
+    lru = RecentKeys(2)
+    lru.add(("t", "a"))
+    lru.add(("t", "b"))
+    assert lru.touch(("t", "a"))
+    lru.add(("t", "c"))
+    assert lru.touch(("t", "a"))
+    assert not lru.touch(("t", "b"))
+    assert len(lru) == 2
+
+
+def test_prefilter_classification():
+    pf = DedupPrefilter(lru_size=1, bloom_capacity=100)
+    assert pf.classify(("t", "a")) == "absent"
+    pf.add(("t", "a"))
+    pf.add(("t", "b"))
+    assert pf.classify(("t", "b")) == "duplicate"
+    assert pf.classify(("t", "a")) == "maybe"
+    assert DedupPrefilter(lru_size=1).classify(("t", "x")) == "unknown"
+
+
+def test_store_with_prefilter_is_exact(tmp_path):
+    db = str(tmp_path / "dedup.db")
+    store = DedupStore(db, lru_size=2, bloom_capacity=1000)
+    store.init_db()
+    assert store.record_events([make_event("pf", "a"), make_event("pf", "b"), make_event("pf", "a")]) == [True, True, False]
+    assert store.record_events([make_event("pf", "a"), make_event("pf", "c")]) == [False, True]
+    stats = store.prefilter_stats()
+    assert stats["lru_hits"] == 1
+    assert stats["bloom_negatives"] >= 3
+    store.close()
+
+    # Warmed from the table on restart: every stored key is still a duplicate.
+    store2 = DedupStore(db, lru_size=1, bloom_capacity=1000)
+    store2.init_db()
+    assert store2.prefilter_stats()["bloom_keys"] == 3
+    assert store2.record_events([make_event("pf", "a"), make_event("pf", "b"), make_event("pf", "c"), make_event("pf", "d")]) == [False, False, False, True]
+    assert len(store2.list_events("pf")) == 4
+    store2.close()
+
+
+def test_store_lru_only_warms_from_tail(tmp_path):
+    db = str(tmp_path / "dedup.db")
+    store = DedupStore(db)
+    store.init_db()
+    store.record_events([make_event("pf", f"id-{i}") for i in range(10)])
+    store.close()
+
+    store2 = DedupStore(db, lru_size=3)
+    store2.init_db()
+    assert store2.prefilter_stats()["lru_size"] == 3
+    assert store2.record_events([make_event("pf", "id-9"), make_event("pf", "id-0")]) == [False, False]
+    assert store2.prefilter_stats()["lru_hits"] == 1
+    store2.close()
+
+
+def test_prefilter_stats_do_not_wait_for_the_writer(tmp_path):
+    store = DedupStore(str(tmp_path / "p.db"), lru_size=10)
+    store.init_db()
+    store.record_events([{"topic": "t", "event_id": "1", "timestamp": "x", "source": "s", "payload": {}}])
+    # Stand-in for a writer in the middle of a long batch.
+    with store._lock:
+        assert store.prefilter_stats()["lru_size"] == 1
+    store.close()
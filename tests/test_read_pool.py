@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.dedup import DedupStore
+from tests.helpers import make_event
+
+
+def test_reads_do_not_wait_for_the_writer_lock(tmp_path):
+    store = DedupStore(str(tmp_path / "rp.db"), journal_mode="WAL", read_connections=2)
+    store.init_db()
+    store.record_events([make_event("rp", "a"), make_event("rp", "b")])
+    with ThreadPoolExecutor(2) as pool:
+        # A long write transaction holds the lock; pooled readers still answer.
+        with store._lock:
+            page = pool.submit(store.list_events_page, "rp", 10).result(timeout=5)
+            topics = pool.submit(store.topic_stats).result(timeout=5)
+    assert [e["event_id"] for _, e in page] == ["a", "b"]
+    assert topics[0]["unique_count"] == 2
+    store.record_events([make_event("rp", "c")])
+    assert [e["event_id"] for e in store.list_events("rp")] == ["a", "b", "c"]
+    store.close()
+
+
+def test_read_pool_requires_wal(tmp_path):
+    store = DedupStore(str(tmp_path / "j.db"), journal_mode="DELETE", read_connections=2)
+    store.init_db()
+    store.record_events([make_event("rp", "a")])
+    assert store._readers is None
+    assert store.list_topics() == ["rp"]
+    store.close()
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.dedup import DedupStore
+from src.main import create_app
+from tests.helpers import make_event, wait_until
+
+HOUR = 3600.0
+
+
+def _store(path, **kwargs):
+    store = DedupStore(str(path), retention_seconds=2 * HOUR, partition_seconds=HOUR, **kwargs)
+    store._clock = lambda: store.now
+    store.now = 100 * HOUR
+    store.init_db()
+    return store
+
+
+def test_partitions_dedup_within_window_and_drop_whole_tables(tmp_path):
+    store = _store(tmp_path / "r.db")
+    assert store.record_events([make_event("rt", "a"), make_event("rt", "b")]) == [True, True]
+    store.now += HOUR
+    assert store.record_events([make_event("rt", "a"), make_event("rt", "c")]) == [False, True]
+    assert [p["rows"] for p in store.partition_stats()] == [2, 1]
+
+    # Three hours later the first partition is outside the window: it is no longer
+    # probed and compaction drops it as one table.
+    store.now += 2 * HOUR
+    assert store.record_events([make_event("rt", "b")]) == [True]
+    assert store.drop_expired_partitions() == ["events_p100"]
+    assert [e["event_id"] for e in store.list_events("rt")] == ["c", "b"]
+    assert [p["name"] for p in store.partition_stats()] == ["events_p101", "events_p103"]
+    stats = store.topic_stats()[0]
+    assert stats["unique_count"] == 2 == len(store.list_events("rt"))
+    assert stats["duplicate_count"] == 1
+    store.close()
+
+
+def test_lru_respects_the_window_before_compaction(tmp_path):
+    store = _store(tmp_path / "l.db", lru_size=100)
+    assert store.record_events([make_event("rt", "a"), make_event("rt", "b")]) == [True, True]
+    store.now += HOUR
+    # "a" is now in the LRU, tagged with the partition of its stored copy.
+    assert store.record_events([make_event("rt", "a"), make_event("rt", "c")]) == [False, True]
+    store.now += 2 * HOUR
+    # events_p100 left the window but has not been dropped yet: resends are new.
+    assert store.record_events([make_event("rt", "a"), make_event("rt", "b"), make_event("rt", "c")]) == [True, True, False]
+    assert store.record_events([make_event("rt", "a")]) == [False]
+    store.close()
+
+    # Keys warmed into the LRU at startup carry their partition too.
+    reopened = _store(tmp_path / "l.db", lru_size=100)
+    reopened.now = store.now + 2 * HOUR
+    assert reopened.record_events([make_event("rt", "c")]) == [True]
+    reopened.close()
+
+
+def test_pagination_is_ordered_across_partitions(tmp_path):
+    store = _store(tmp_path / "p.db")
+    for hour in range(3):
+        store.record_events([make_event("rt", f"{hour}-{i}") for i in range(3)])
+        store.now += HOUR
+    page = store.list_events_page("rt", limit=4)
+    assert [e["event_id"] for _, e in page] == ["0-0", "0-1", "0-2", "1-0"]
+    rest = store.list_events_page("rt", limit=10, after=page[-1][0])
+    assert [e["event_id"] for _, e in rest] == ["1-1", "1-2", "2-0", "2-1", "2-2"]
+    store.close()
+
+
+def test_bloom_rebuild_and_incremental_vacuum(tmp_path):
+    path = tmp_path / "v.db"
+    store = _store(path, lru_size=0, bloom_capacity=1000)
+    store.record_events([{**make_event("rt", f"old-{i}"), "payload": {"blob": "x" * 2000}} for i in range(200)])
+    store.now += 3 * HOUR
+    store.record_events([make_event("rt", "live")])
+    assert store.drop_expired_partitions() == ["events_p100"]
+    for _ in store.rebuild_prefilter(chunk_size=10):
+        pass
+    assert store.prefilter.classify(("rt", "old-1")) == "absent"
+    assert store.prefilter.classify(("rt", "live")) == "maybe"
+
+    size_before = os.path.getsize(path)
+    while store.incremental_vacuum(pages=16) > 0:
+        pass
+    store.close()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    conn.close()
+    assert os.path.getsize(path) < size_before
+
+
+def test_legacy_table_becomes_first_partition(tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy = DedupStore(str(path))
+    legacy.init_db()
+    legacy.record_events([make_event("rt", "old")])
+    legacy.close()
+
+    store = _store(path)
+    assert store.record_events([make_event("rt", "old"), make_event("rt", "new")]) == [False, True]
+    assert [p["name"] for p in store.partition_stats()] == ["events", "events_p100"]
+    assert [e["event_id"] for e in store.list_events("rt")] == ["old", "new"]
+    store.close()
+
+
+def test_stats_reports_partitions(tmp_path):
+    settings = Settings(retention_days=1, partition_hours=1, shards=2)
+    with TestClient(create_app(str(tmp_path / "s.db"), settings)) as client:
+        client.post("/publish", json=[make_event("rt", str(i)) for i in range(10)])
+
+        def all_rows_written():
+            parts = client.get("/stats").json()["partitions"]
+            return parts if sum(p["rows"] for p in parts) == 10 else None
+
+        parts = wait_until(all_rows_written, what="10 partitioned rows")
+    assert {p["shard"] for p in parts} <= {0, 1}
+    assert all(not p["expired"] and p["approx_bytes"] > 0 for p in parts)
+
+
+def test_fractional_retention_settings_from_env(monkeypatch):
+    monkeypatch.setenv("AGGREGATOR_RETENTION_DAYS", "0.5")
+    monkeypatch.setenv("AGGREGATOR_PARTITION_HOURS", "1.5")
+    monkeypatch.setenv("AGGREGATOR_COMPACTION_INTERVAL_SECONDS", "2.5")
+    settings = Settings.from_env()
+    assert (settings.retention_days, settings.partition_hours, settings.compaction_interval_seconds) == (0.5, 1.5, 2.5)
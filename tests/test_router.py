@@ -0,0 +1,120 @@
+import os
+import socket
+import sys
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from loadgen import InProcessServer  # noqa: E402
+
+from src.config import Settings  # noqa: E402
+from src.ring import HashRing  # noqa: E402
+from src.router import create_router_app, format_router_cursor, parse_router_cursor, split_limit  # noqa: E402
+from tests.helpers import make_event, wait_processed  # noqa: E402
+
+
+def test_ring_spreads_topics_and_moves_few_on_membership_change():
+    topics = [f"topic-{i}" for i in range(4000)]
+    ring = HashRing(["a", "b", "c", "d"], vnodes=160)
+    before = {t: ring.node_for(t) for t in topics}
+    counts = [len(owned) for owned in ring.assign(topics).values()]
+    assert len(counts) == 4 and min(counts) > 700
+
+    ring.add("e")
+    after = {t: ring.node_for(t) for t in topics}
+    moved = [t for t in topics if before[t] != after[t]]
+    # Only topics taken over by the new node move, about 1/5 of them.
+    assert all(after[t] == "e" for t in moved)
+    assert 0.12 < len(moved) / len(topics) < 0.28
+
+    ring.remove("b")
+    final = {t: ring.node_for(t) for t in topics}
+    assert all(final[t] == after[t] for t in topics if after[t] != "b")
+    assert "b" not in final.values()
+
+
+def test_router_cursor_and_limit_split():
+    nodes = ["http://a", "http://b"]
+    assert parse_router_cursor(None, nodes) == {"http://a": "", "http://b": ""}
+    cursor = format_router_cursor({"http://a": "3,4", "http://b": None})
+    # A node that is not in the cursor yet (newly added) starts from the beginning.
+    assert parse_router_cursor(cursor, nodes + ["http://c"]) == {"http://a": "3,4", "http://b": None, "http://c": ""}
+    assert split_limit(7, nodes) == {"http://a": 4, "http://b": 3}
+    assert split_limit(1, nodes) == {"http://a": 1}
+
+
+def test_router_over_two_nodes(tmp_path):
+    settings = Settings(log_events_per_second=0)
+    with InProcessServer(str(tmp_path / "n1" / "dedup.db"), settings) as n1, InProcessServer(
+        str(tmp_path / "n2" / "dedup.db"), settings
+    ) as n2:
+        router = create_router_app(Settings(router_vnodes=64), nodes=[n1.url, n2.url])
+        ring = router.state.ring
+        events = [make_event(f"t{i % 50 % 12}", f"id-{i % 50}") for i in range(60)]
+        with TestClient(router) as client:
+            response = client.post("/publish", json=events + [{"topic": "bad"}])
+            assert response.status_code == 202
+            assert response.json()["accepted"] == 60 and response.json()["invalid"][0]["index"] == 60
+            stats = wait_processed(client, 60, timeout=10)
+            assert stats["unique_processed"] == 50 and stats["duplicate_dropped"] == 10
+            assert [node["ok"] for node in stats["nodes"]] == [True, True]
+            assert sum(node["received"] for node in stats["nodes"]) == 60
+
+            # Every node only stores the topics the ring gave it.
+            owners = ring.assign(sorted({e["topic"] for e in events}))
+            for node_stats in stats["nodes"]:
+                assert node_stats["topics"] == len(owners.get(node_stats["node"], []))
+
+            assert len(client.get("/events").json()) == 50
+            assert len(client.get("/events", params={"topic": "t3"}).json()) == len({e["event_id"] for e in events if e["topic"] == "t3"})
+
+            seen, cursor = [], None
+            while True:
+                params = {"limit": 7, **({"after": cursor} if cursor else {})}
+                page = client.get("/events", params=params)
+                assert len(page.json()) <= 7
+                seen.extend((row["topic"], row["event_id"]) for row in page.json())
+                cursor = page.headers.get("x-next-cursor")
+                if cursor is None:
+                    break
+            assert len(seen) == len(set(seen)) == 50
+
+            topic_stats = client.get("/stats/topics").json()
+            assert [row["topic"] for row in topic_stats] == sorted({e["topic"] for e in events})
+            assert sum(row["unique_count"] for row in topic_stats) == 50
+            assert client.get("/cluster", params={"topic": "t3"}).json()["owner"] == ring.node_for("t3")
+
+
+def test_router_passes_node_client_errors_through(tmp_path):
+    node_settings = Settings(log_events_per_second=0, max_body_bytes=200)
+    with InProcessServer(str(tmp_path / "dedup.db"), node_settings) as node:
+        router = create_router_app(Settings(), nodes=[node.url])
+        with TestClient(router) as client:
+            assert client.post("/publish", params={"on_full": "bogus"}, json=[make_event("t", "1")]).status_code == 400
+            assert client.post("/publish", params={"wait_ms": -1}, json=[make_event("t", "1")]).status_code == 422
+
+            # The node's body limit is below the router's: a 413 is not retryable, so no Retry-After.
+            response = client.post("/publish", json=[make_event("t", str(i)) for i in range(10)])
+            assert response.status_code == 413 and "retry-after" not in response.headers
+            assert response.json()["node"] == node.url and response.json()["accepted"] == 0
+
+
+def test_router_reports_events_for_unreachable_node(tmp_path):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    with InProcessServer(str(tmp_path / "dedup.db"), Settings(log_events_per_second=0)) as live:
+        router = create_router_app(Settings(router_timeout_seconds=2), nodes=[live.url, dead])
+        events = [make_event(f"t{i}", f"id-{i}") for i in range(20)]
+        with TestClient(router) as client:
+            response = client.post("/publish", json=events)
+            assert response.status_code == 429
+            body = response.json()
+            assert body["accepted"] + body["rejected"] == 20
+            assert {item["topic"] for item in body["queued"]} == {
+                e["topic"] for e in events if router.state.ring.node_for(e["topic"]) == live.url
+            }
+            stats = client.get("/stats").json()
+            assert [node["ok"] for node in stats["nodes"]] == [True, False]
+            assert client.get("/events").status_code == 502
@@ -0,0 +1,84 @@
+import asyncio
+import multiprocessing
+
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.counters import SqliteCounters
+from src.main import create_app
+from src.sharding import shard_for, shard_paths
+from tests.helpers import make_event, wait_processed
+
+
+def test_shard_routing_is_stable_and_spread():
+    assert shard_for("t", "e", 1) == 0
+    assert shard_for("t", "e", 8) == shard_for("t", "e", 8)
+    counts = [0] * 4
+    for i in range(1000):
+        counts[shard_for("t", f"id-{i}", 4)] += 1
+    assert min(counts) > 150
+
+
+def test_shard_paths():
+    assert shard_paths("./data/dedup.db", 1) == ["./data/dedup.db"]
+    assert shard_paths("./data/dedup.db", 2) == ["./data/dedup.shard0.db", "./data/dedup.shard1.db"]
+
+
+def test_sharded_app_merges_events_and_stats(tmp_path):
+    app = create_app(str(tmp_path / "dedup.db"), Settings(shards=4))
+    with TestClient(app) as client:
+        events = [make_event(f"t{(i % 160) % 3}", f"id-{i % 160}") for i in range(200)]
+        assert client.post("/publish", json=events).status_code == 202
+        stats = wait_processed(client, 200)
+        assert stats["unique_processed"] == 160
+        assert stats["duplicate_dropped"] == 40
+        assert sorted(stats["topics"]) == ["t0", "t1", "t2"]
+        assert len(stats["shards"]) == 4
+        assert len(client.get("/events").json()) == 160
+    assert all((tmp_path / f"dedup.shard{i}.db").exists() for i in range(4))
+
+
+def _bump(path, n):
+    counters = SqliteCounters(path, ["received"])
+    for _ in range(n):
+        counters.add(received=1)
+    counters.close()
+
+
+def test_shared_counters_are_exact_across_processes(tmp_path):
+    path = str(tmp_path / "counters.db")
+    SqliteCounters(path, ["received"]).close()
+    procs = [multiprocessing.Process(target=_bump, args=(path, 200)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    counters = SqliteCounters(path, ["received"])
+    assert counters.snapshot() == {"received": 600}
+    counters.close()
+
+
+def test_shared_counters_stay_off_the_event_loop(tmp_path):
+    settings = Settings(shared_counters=True, spool_dir=str(tmp_path / "spool"))
+    app = create_app(str(tmp_path / "dedup.db"), settings)
+    counters = app.state.counters
+    on_loop = []
+
+    def guard(method):
+        def call(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(method.__name__)
+            except RuntimeError:
+                pass
+            return method(*args, **kwargs)
+        return call
+
+    counters.add = guard(counters.add)
+    counters.snapshot = guard(counters.snapshot)
+    with TestClient(app) as client:
+        ev = make_event("c", "1")
+        assert client.post("/publish", json=[ev, ev]).status_code == 202
+        wait_processed(client, 2)
+        assert 'aggregator_events_total{outcome="received"} 2' in client.get("/metrics").text
+    assert on_loop == []
@@ -0,0 +1,196 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.main import create_app
+from src.spool import Spool, SpoolError
+from tests.helpers import make_event, wait_processed, wait_until
+
+
+def _open(directory, **kwargs):
+    spool = Spool(str(directory), **kwargs)
+    spool.open()
+    replayed = [ev["event_id"] for events in spool.replay() for ev in events]
+    spool.finish_replay()
+    return spool, replayed
+
+
+def test_replays_only_unacknowledged_records(tmp_path):
+    spool, _ = _open(tmp_path)
+    for name in "abc":
+        spool.append(spool.reserve(), [make_event("sp", name)])
+    spool.ack(1)
+    spool.close()
+
+    spool, replayed = _open(tmp_path)
+    assert replayed == ["b", "c"]
+    spool.close()
+    # finish_replay moved the checkpoint past everything replayed.
+    spool, replayed = _open(tmp_path)
+    assert replayed == []
+    spool.close()
+
+
+def test_ack_before_append_and_torn_tail(tmp_path):
+    spool, _ = _open(tmp_path, fsync="none")
+    first, second = spool.reserve(), spool.reserve()
+    spool.ack(1)
+    spool.append(first, [make_event("sp", "a")])
+    end = spool.append(second, [make_event("sp", "b")])
+    assert spool.checkpoint < end
+    spool.close()
+
+    segment = os.path.join(str(tmp_path), "%012d.log" % end[0])
+    with open(segment, "ab") as f:
+        f.write(b"\x00\x00\x01\x00garbage")
+    spool, replayed = _open(tmp_path)
+    assert replayed == ["b"]
+    assert os.path.getsize(segment) == end[1]
+    spool.close()
+
+
+def test_consumed_segments_are_recycled(tmp_path):
+    spool, _ = _open(tmp_path, segment_bytes=200)
+    for i in range(10):
+        spool.append(spool.reserve(), [make_event("sp", str(i))])
+    assert len(spool.segments()) > 3
+    spool.ack(10)
+    assert spool.segments() == [spool.checkpoint[0]]
+    spool.close()
+
+
+def test_directory_is_locked(tmp_path):
+    spool, _ = _open(tmp_path)
+    with pytest.raises(SpoolError):
+        Spool(str(tmp_path)).open()
+    spool.close()
+
+
+def test_lifespan_replays_spool(tmp_path):
+    spool_dir = tmp_path / "spool"
+    # Simulates a crash: chunks accepted into the spool but never acknowledged.
+    spool, _ = _open(spool_dir / "shard0")
+    spool.append(spool.reserve(), [make_event("sp", "x"), make_event("sp", "y")])
+    spool.close()
+
+    settings = Settings(spool_dir=str(spool_dir))
+    with TestClient(create_app(str(tmp_path / "db.sqlite"), settings)) as client:
+        assert [e["event_id"] for e in client.get("/events").json()] == ["x", "y"]
+        assert client.post("/publish", json=[make_event("sp", "y"), make_event("sp", "z")]).status_code == 202
+        for _ in range(200):
+            stats = client.get("/stats").json()
+            if stats["unique_processed"] == 3 and stats["spool"]["pending_records"] == 0:
+                break
+            time.sleep(0.01)
+    assert stats["unique_processed"] == 3 and stats["duplicate_dropped"] == 1
+    assert stats["spool"]["replayed_events"] == 2 and stats["spool"]["pending_records"] == 0
+
+    # Everything was acknowledged, so a restart replays nothing.
+    with TestClient(create_app(str(tmp_path / "db.sqlite"), settings)) as client:
+        assert client.get("/stats").json()["spool"]["replayed_events"] == 0
+
+
+def test_failed_batch_is_retried_before_ack(tmp_path):
+    settings = Settings(spool_dir=str(tmp_path / "spool"))
+    app = create_app(str(tmp_path / "db.sqlite"), settings)
+    store = app.state.shards[0].store
+    write = store.record_events_rowids
+    failures = []
+
+    def flaky(events):
+        if len(failures) < 2:
+            failures.append(len(events))
+            raise OSError("disk full")
+        return write(events)
+
+    store.record_events_rowids = flaky
+    with TestClient(app) as client:
+        assert client.post("/publish", json=[make_event("sp", "a"), make_event("sp", "b")]).status_code == 202
+        for _ in range(300):
+            stats = client.get("/stats").json()
+            if stats["unique_processed"] == 2:
+                break
+            time.sleep(0.01)
+        assert failures == [2, 2]
+        assert stats["unique_processed"] == 2 and stats["spool"]["pending_records"] == 0
+        assert [e["event_id"] for e in client.get("/events").json()] == ["a", "b"]
+
+
+def test_failed_batch_stays_in_spool_until_written(tmp_path):
+    settings = Settings(spool_dir=str(tmp_path / "spool"))
+    app = create_app(str(tmp_path / "db.sqlite"), settings)
+    store = app.state.shards[0].store
+
+    def broken(events):
+        raise OSError("disk full")
+
+    store.record_events_rowids = broken
+    with TestClient(app) as client:
+        assert client.post("/publish", json=[make_event("sp", "a")]).status_code == 202
+        time.sleep(0.3)
+        assert client.get("/stats").json()["spool"]["pending_records"] == 1
+
+    # The batch was never acknowledged, so the next start replays it.
+    with TestClient(create_app(str(tmp_path / "db.sqlite"), settings)) as client:
+        assert [e["event_id"] for e in client.get("/events").json()] == ["a"]
+
+
+def test_workers_claim_separate_slots_and_replay_orphans(tmp_path):
+    spool_dir = tmp_path / "spool"
+    # A slot left by a worker that no longer runs (e.g. --workers went from 4 to 2).
+    orphan, _ = _open(spool_dir / "shard0" / "worker3")
+    orphan.append(orphan.reserve(), [make_event("sp", "orphan")])
+    orphan.close()
+
+    settings = Settings(spool_dir=str(spool_dir))
+    db = str(tmp_path / "db.sqlite")
+    # Two workers of the same deployment start side by side.
+    with TestClient(create_app(db, settings)) as first, TestClient(create_app(db, settings)) as second:
+        directories = {first.app.state.shards[0].spool.directory, second.app.state.shards[0].spool.directory}
+        assert directories == {str(spool_dir / "shard0" / "worker0"), str(spool_dir / "shard0" / "worker1")}
+        assert [e["event_id"] for e in first.get("/events").json()] == ["orphan"]
+        assert first.get("/stats").json()["spool"]["replayed_events"] == 1
+        assert second.get("/stats").json()["spool"]["replayed_events"] == 0
+
+    # The orphan slot was emptied, so it is not replayed again.
+    spool, replayed = _open(spool_dir / "shard0" / "worker3")
+    assert replayed == []
+    spool.close()
+
+
+def test_unwritable_event_is_dropped_and_acked(tmp_path):
+    spool_dir = tmp_path / "spool"
+    # An event the store can never write, already in the spool from a previous run.
+    spool, _ = _open(spool_dir / "shard0" / "worker0")
+    spool.append(spool.reserve(), [make_event("sp", "r1"), make_event("sp", "bad"), make_event("sp", "r2")])
+    spool.close()
+
+    settings = Settings(spool_dir=str(spool_dir), batch_size=8)
+    app = create_app(str(tmp_path / "db.sqlite"), settings)
+    store = app.state.shards[0].store
+    write = store.record_events_rowids
+
+    def rejecting(events):
+        if any(event["event_id"] == "bad" for event in events):
+            raise ValueError("cannot encode event")
+        return write(events)
+
+    store.record_events_rowids = rejecting
+    with TestClient(app) as client:
+        assert client.get("/stats").json()["write_failed"] == 1
+        response = client.post("/publish", json=[make_event("sp", "a"), make_event("sp", "bad"), make_event("sp", "b"), make_event("sp", "a")])
+        assert response.status_code == 202
+
+        def dropped_and_acked():
+            stats = client.get("/stats").json()
+            return stats if stats["write_failed"] == 2 and stats["spool"]["pending_records"] == 0 else None
+
+        stats = wait_until(dropped_and_acked, what="the bad event to be dropped")
+        assert stats["unique_processed"] == 4 and stats["duplicate_dropped"] == 1
+        assert [e["event_id"] for e in client.get("/events").json()] == ["r1", "r2", "a", "b"]
+        # The shard keeps going after the bad event.
+        client.post("/publish", json=[make_event("sp", "c")])
+        wait_processed(client, 6)
@@ -0,0 +1,289 @@
+"""Concurrent load generator for the aggregator.
+
+Sends batches to /publish over a pooled keep-alive httpx client, polls
+/stats for the ingest-to-processed backlog and prints a JSON report with
+publish latency percentiles and sustained throughput.
+
+Usage:
+    python tools/loadgen.py --events 20000 --concurrency 16 --batch-size 100 --dup-ratio 0.2
+    python tools/loadgen.py --url http://localhost:8080 --rate 5000 --zipf 1.1
+
+Without --url the app is started in-process with create_app (fresh database
+in a temp dir unless --db is given), served by uvicorn on a free local port.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class ZipfPicker:
+    """Pick an index in [0, n) with P(k) ~ 1 / (k + 1) ** s; s=0 is uniform."""
+
+    def __init__(self, max_n: int, s: float, rng: random.Random):
+        self.s = s
+        self.rng = rng
+        self._cumulative = list(itertools.accumulate(1.0 / (k + 1) ** s for k in range(max_n))) if s > 0 else []
+
+    def pick(self, n: int) -> int:
+        if self.s <= 0:
+            return self.rng.randrange(n)
+        return bisect.bisect_left(self._cumulative, self.rng.random() * self._cumulative[n - 1], 0, n - 1)
+
+
+def generate_batches(
+    events: int, batch_size: int, dup_ratio: float, zipf: float, topics: int, seed: int = 0
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield batches of events; a ``dup_ratio`` share re-sends an earlier key.
+
+    Duplicates (and topics) follow the Zipf skew: low ranks are hot keys.
+    """
+    rng = random.Random(seed)
+    picker = ZipfPicker(events, zipf, rng)
+    unique = 0
+    batch: List[Dict[str, Any]] = []
+    for _ in range(events):
+        if unique and rng.random() < dup_ratio:
+            rank = picker.pick(unique)
+        else:
+            rank = unique
+            unique += 1
+        batch.append(
+            {
+                "topic": f"bench-{rank % topics}",
+                "event_id": f"ev-{rank}",
+                "timestamp": "2025-10-24T00:00:00Z",
+                "source": "loadgen",
+                "payload": {"rank": rank},
+            }
+        )
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _processed(stats: Dict[str, Any]) -> int:
+    return stats["unique_processed"] + stats["duplicate_dropped"]
+
+
+async def run_load(
+    url: str,
+    events: int = 10000,
+    concurrency: int = 8,
+    rate: float = 0,
+    batch_size: int = 100,
+    dup_ratio: float = 0.2,
+    zipf: float = 0.0,
+    topics: int = 10,
+    poll_interval: float = 0.1,
+    drain_timeout: float = 60.0,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Drive /publish and return the report dict.
+
+    ``rate`` is the target events per second across all workers (0 = as fast
+    as possible). Counters are read as deltas, so the target does not need a
+    fresh database.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        baseline = (await client.get("/stats")).json()
+        batches = generate_batches(events, batch_size, dup_ratio, zipf, topics, seed)
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        accepted = 0
+        sent = 0
+        started = time.perf_counter()
+        samples: List[Dict[str, float]] = []
+
+        async def worker():
+            nonlocal accepted, sent
+            for batch in batches:
+                if rate > 0:
+                    # Open-loop pacing: each batch has a scheduled start time.
+                    due = started + sent / rate
+                    sent += len(batch)
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    sent += len(batch)
+                t0 = time.perf_counter()
+                response = await client.post("/publish", json=batch)
+                latencies.append(time.perf_counter() - t0)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+                if response.status_code in (200, 202, 429):
+                    accepted += response.json().get("accepted", len(batch))
+
+        async def poller():
+            while True:
+                stats = (await client.get("/stats")).json()
+                backlog = (stats["received"] - baseline["received"]) - (_processed(stats) - _processed(baseline))
+                samples.append({"t": round(time.perf_counter() - started, 4), "backlog": backlog})
+                await asyncio.sleep(poll_interval)
+
+        poll_task = asyncio.create_task(poller())
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            sent_at = time.perf_counter()
+            drained_at = None
+            while time.perf_counter() - sent_at < drain_timeout:
+                stats = (await client.get("/stats")).json()
+                if _processed(stats) - _processed(baseline) >= accepted:
+                    drained_at = time.perf_counter()
+                    break
+                await asyncio.sleep(poll_interval / 4)
+        finally:
+            poll_task.cancel()
+            try:
+                await poll_task
+            except asyncio.CancelledError:
+                pass
+        final = (await client.get("/stats")).json()
+
+    latencies.sort()
+    send_seconds = sent_at - started
+    report = {
+        "config": {
+            "events": events,
+            "concurrency": concurrency,
+            "rate": rate,
+            "batch_size": batch_size,
+            "dup_ratio": dup_ratio,
+            "zipf": zipf,
+            "topics": topics,
+        },
+        "requests": len(latencies),
+        "status_codes": statuses,
+        "accepted_events": accepted,
+        "publish_latency_ms": {
+            name: (round(percentile(latencies, q) * 1000, 3) if latencies else None)
+            for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+        "send_seconds": round(send_seconds, 4),
+        "publish_events_per_second": round(accepted / send_seconds, 1) if send_seconds > 0 else None,
+        "unique_processed": final["unique_processed"] - baseline["unique_processed"],
+        "duplicate_dropped": final["duplicate_dropped"] - baseline["duplicate_dropped"],
+        "lag": {
+            "max_backlog_events": max((s["backlog"] for s in samples), default=0),
+            "drain_seconds": round(drained_at - sent_at, 4) if drained_at is not None else None,
+            "samples": samples,
+        },
+    }
+    if drained_at is not None:
+        total = drained_at - started
+        report["processed_events_per_second"] = round(accepted / total, 1) if total > 0 else None
+    return report
+
+
+class InProcessServer:
+    """Serve ``create_app`` with uvicorn on a free local port in a background thread."""
+
+    def __init__(self, db_path: str, settings=None):
+        import uvicorn
+
+        from src.main import create_app
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(create_app(db_path, settings), host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "InProcessServer":
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("In-process server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Target aggregator; omit to start create_app in-process")
+    parser.add_argument("--db", help="Database path for the in-process app (default: temp dir)")
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0, help="Target events/second, 0 = unlimited")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dup-ratio", type=float, default=0.2)
+    parser.add_argument("--zipf", type=float, default=0.0, help="Zipf exponent for duplicate keys, 0 = uniform")
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", action="store_true", help="Keep every /stats backlog sample in the report")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    # One INFO line per request would dominate the client's CPU time.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    def run(url: str) -> Dict[str, Any]:
+        return asyncio.run(
+            run_load(
+                url,
+                events=args.events,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                batch_size=args.batch_size,
+                dup_ratio=args.dup_ratio,
+                zipf=args.zipf,
+                topics=args.topics,
+                seed=args.seed,
+            )
+        )
+
+    if args.url:
+        report = run(args.url)
+    else:
+        from src.config import Settings
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = args.db or os.path.join(tmp, "bench.db")
+            with InProcessServer(db_path, Settings.from_env()) as server:
+                report = run(server.url)
+    if not args.samples:
+        report["lag"].pop("samples")
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""In-process microbenchmarks of the storage backend hot paths.
+
+Measures, on a fresh database in a temp dir:
+- insert: record_events with only new keys
+- duplicate: record_events re-sending the same keys
+- list: list_events_page walking the whole table
+
+Usage: python tools/microbench.py [--events 50000] [--batch-size 100] [--lru-size 10000] [--bloom-capacity 0]
+       python tools/microbench.py --backend bitcask
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.bitcask import BitcaskStore  # noqa: E402
+from src.dedup import DedupStore  # noqa: E402
+
+
+def _events(n: int, offset: int = 0) -> List[Dict[str, Any]]:
+    return [
+        {
+            "topic": f"bench-{i % 10}",
+            "event_id": f"ev-{i}",
+            "timestamp": "2025-10-24T00:00:00Z",
+            "source": "microbench",
+            "payload": {"i": i, "text": "x" * 64},
+        }
+        for i in range(offset, offset + n)
+    ]
+
+
+def _result(ops: int, seconds: float, calls: int) -> Dict[str, Any]:
+    return {
+        "ops": ops,
+        "seconds": round(seconds, 4),
+        "ops_per_second": round(ops / seconds, 1) if seconds > 0 else None,
+        "us_per_call": round(seconds / calls * 1e6, 1) if calls else None,
+    }
+
+
+def run_microbench(
+    events: int = 50000,
+    batch_size: int = 100,
+    page_size: int = 1000,
+    store_kwargs: Optional[Dict[str, Any]] = None,
+    db_dir: Optional[str] = None,
+    backend: str = "sqlite",
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(dir=db_dir) as tmp:
+        if backend == "bitcask":
+            store = BitcaskStore(os.path.join(tmp, "bench.bitcask"), **(store_kwargs or {}))
+        else:
+            store = DedupStore(os.path.join(tmp, "bench.db"), **(store_kwargs or {}))
+        store.init_db()
+        data = _events(events)
+        batches = [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
+        results: Dict[str, Any] = {}
+        try:
+            t0 = time.perf_counter()
+            for batch in batches:
+                store.record_events(batch)
+            results["insert"] = _result(events, time.perf_counter() - t0, len(batches))
+
+            t0 = time.perf_counter()
+            for batch in batches:
+                store.record_events(batch)
+            results["duplicate"] = _result(events, time.perf_counter() - t0, len(batches))
+
+            t0 = time.perf_counter()
+            after, rows, pages = 0, 0, 0
+            while True:
+                page = store.list_events_page(limit=page_size, after=after)
+                pages += 1
+                rows += len(page)
+                if len(page) < page_size:
+                    break
+                after = page[-1][0]
+            results["list"] = _result(rows, time.perf_counter() - t0, pages)
+            results["prefilter"] = store.prefilter_stats()
+        finally:
+            store.close()
+    return {
+        "config": {"events": events, "batch_size": batch_size, "page_size": page_size, "backend": backend, **(store_kwargs or {})},
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--lru-size", type=int, default=10000)
+    parser.add_argument("--bloom-capacity", type=int, default=0)
+    parser.add_argument("--synchronous", default="NORMAL")
+    parser.add_argument("--backend", choices=("sqlite", "bitcask"), default="sqlite")
+    parser.add_argument("--dir", help="Directory for the temporary database (default: system temp)")
+    args = parser.parse_args(argv)
+    if args.backend == "bitcask":
+        store_kwargs = {"synchronous": args.synchronous}
+    else:
+        store_kwargs = {
+            "journal_mode": "WAL",
+            "synchronous": args.synchronous,
+            "lru_size": args.lru_size,
+            "bloom_capacity": args.bloom_capacity,
+        }
+    report = run_microbench(args.events, args.batch_size, args.page_size, store_kwargs, args.dir, args.backend)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
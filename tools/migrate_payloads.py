@@ -0,0 +1,21 @@
+"""Convert legacy repr payloads in dedup.db (or every shard file) to the JSON codec.
+
+Usage: python tools/migrate_payloads.py [./data/dedup.db ...]
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.dedup import DedupStore  # noqa: E402
+
+paths = sys.argv[1:] or [os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "dedup.db"))]
+out = {}
+for path in paths:
+    store = DedupStore(path)
+    store.init_db()
+    out[path] = store.migrate_payloads()
+    store.close()
+
+print(json.dumps({"migrated_rows": out}, indent=2))